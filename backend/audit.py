@@ -0,0 +1,158 @@
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Optional
+
+from sqlalchemy import insert
+from sqlmodel import Session
+
+# Background writer for audit entries that do not have to commit together with a state change.
+# Entries are queued by request handlers and bulk-inserted in batches by a single thread.
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class AuditWriter:
+    """Batches audit rows into multi-row INSERTs.
+
+    A batch is written once it has `batch_size` rows or `flush_interval` seconds after its
+    first row. `record` never blocks (it is called from transaction functions, which run on
+    the event loop with DB_ASYNC): beyond `max_queue` queued rows, new entries are dropped,
+    logged and counted in `overflows`, so a stalled database cannot grow memory without bound.
+    A failed write is retried `max_attempts` times with exponential backoff starting at
+    `retry_delay` seconds; only then is the batch dropped, logged as an error and counted in
+    `dropped`. `stop` drains everything still queued. `on_write` is called once after every
+    successful write, outside the retries: its errors are logged, never a reason to insert again.
+    """
+
+    def __init__(
+        self, engine, model, batch_size: int = 500, flush_interval: float = 0.5, max_queue: int = 10_000,
+        max_attempts: int = 5, retry_delay: float = 0.5, on_write: Optional[Callable[[], None]] = None,
+    ):
+        self.engine = engine
+        self.model = model
+        self.on_write = on_write
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        # set while entries are being dropped, so a full queue logs once rather than per entry
+        self._overflowing = False
+        self._thread: Optional[threading.Thread] = None
+        # metrics
+        self.written = 0
+        self.batches = 0
+        self.sync_writes = 0
+        self.overflows = 0
+        self.retries = 0
+        self.dropped = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Flush all queued entries and stop the writer thread."""
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+    def record(self, user_id: Optional[int], action: str, details: Optional[str] = None):
+        row = {"user_id": user_id, "action": action, "details": details, "created_at": datetime.utcnow()}
+        if self._thread is None:
+            self._write([row])
+            self.sync_writes += 1
+            return
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.overflows += 1
+            if not self._overflowing:
+                self._overflowing = True
+                logger.error("Audit queue full (%d entries): dropping new audit entries", self._queue.maxsize)
+        else:
+            self._overflowing = False
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _insert(self, rows: list[dict]):
+        with Session(self.engine) as session:
+            session.exec(insert(self.model), params=rows)
+            session.commit()
+
+    def _write(self, rows: list[dict]):
+        self._insert(rows)
+        self._notify()
+
+    def _notify(self):
+        if self.on_write is None:
+            return
+        try:
+            self.on_write()
+        except Exception:
+            logger.exception("Audit on_write callback failed")
+
+    def _flush(self, batch: list[dict]):
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                self._insert(batch)
+            except Exception:
+                if attempt == self.max_attempts:
+                    self.dropped += len(batch)
+                    logger.exception("Dropped %d audit entries after %d failed attempts", len(batch), attempt)
+                    return
+                self.retries += 1
+                delay = self.retry_delay * 2 ** (attempt - 1)
+                logger.warning("Failed to write %d audit entries (attempt %d), retrying in %.1fs", len(batch), attempt, delay, exc_info=True)
+                time.sleep(delay)
+            else:
+                self.written += len(batch)
+                self.batches += 1
+                self._notify()
+                return
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                self._flush_rest([])
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            stopping = False
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            if stopping:
+                self._flush_rest(batch)
+                return
+            self._flush(batch)
+
+    def _flush_rest(self, batch: list[dict]):
+        """Write `batch` plus everything still queued (shutdown)."""
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                batch.append(item)
+        for start in range(0, len(batch), self.batch_size):
+            self._flush(batch[start:start + self.batch_size])
@@ -0,0 +1,233 @@
+"""Load-test the request workflow API in-process and report per-endpoint throughput and latency.
+
+Seeds --users users and --requests requests straight into the database (one shared password
+hash, bulk inserts, like create_user.py but without per-user hashing), then runs the app
+in-process through httpx's ASGI transport and drives a weighted mix of login, create_request,
+list_requests (own and admin view), review, approve, notification polling and audit reads
+from --concurrency clients for --duration seconds. Runs fully offline against a temporary
+SQLite database unless --use-env-db is given; that writes to DATABASE_URL (seeded users and
+requests, approvals creating secrets, an 'admin' if none exists), so it also requires
+--i-know-this-mutates and must only point at a disposable database.
+
+Results are printed and, with --output, saved as JSON; pass an earlier file as --compare
+to see the change per endpoint between two commits.
+
+Usage:
+python benchmark.py --users 200 --requests 5000 --duration 20 --output bench.json
+python benchmark.py --compare bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+
+BENCH_PASSWORD = 'bench-password'
+
+# (scenario, weight)
+MIX = [
+    ('login', 2),
+    ('create_request', 8),
+    ('list_requests', 25),
+    ('list_requests_all', 10),
+    ('review_request', 5),
+    ('approve_request', 5),
+    ('notifications', 35),
+    ('audit', 10),
+]
+
+
+def percentile(samples, p):
+    if not samples:
+        return None
+    return samples[min(len(samples) - 1, int(p * len(samples)))]
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def seed(app_main, users, requests):
+    """Bulk-insert users (sharing one password hash) and pending requests; return their ids."""
+    from sqlalchemy import insert
+    from sqlmodel import Session, select
+
+    from hashing import get_password_hash
+
+    hashed = get_password_hash(BENCH_PASSWORD)
+    with Session(app_main.engine) as session:
+        session.exec(insert(app_main.User), params=[
+            {'username': f'bench{i}', 'hashed_password': hashed, 'is_admin': False} for i in range(users)
+        ])
+        session.commit()
+        user_ids = session.exec(select(app_main.User.id).where(app_main.User.username.like('bench%'))).all()
+        now = datetime.utcnow()
+        session.exec(insert(app_main.SecretRequest), params=[
+            {'requester_id': random.choice(user_ids), 'secret_name': f'seed-{i}', 'reason': 'benchmark',
+             'status': 'pending', 'created_at': now}
+            for i in range(requests)
+        ])
+        session.commit()
+        request_ids = session.exec(select(app_main.SecretRequest.id)).all()
+    return list(user_ids), list(request_ids)
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, scenario, seconds, status_code):
+        self.latencies[scenario].append(seconds)
+        # 409 is an expected outcome of racing transitions, not a failure
+        if status_code >= 400 and status_code != 409:
+            self.errors[scenario] += 1
+
+    def report(self, elapsed):
+        out = {}
+        for scenario, samples in sorted(self.latencies.items()):
+            samples.sort()
+            out[scenario] = {
+                'count': len(samples),
+                'errors': self.errors[scenario],
+                'rps': len(samples) / elapsed,
+                'p50_ms': percentile(samples, 0.50) * 1000,
+                'p95_ms': percentile(samples, 0.95) * 1000,
+                'p99_ms': percentile(samples, 0.99) * 1000,
+                'max_ms': samples[-1] * 1000,
+            }
+        return out
+
+
+async def run(app_main, args, user_ids, request_ids):
+    import httpx
+
+    transport = httpx.ASGITransport(app=app_main.app)
+    async with app_main.app.router.lifespan_context(app_main.app):
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=120) as client:
+            admin_token = (await client.post('/api/login', json={'username': 'admin', 'password': 'password'})).json()['access_token']
+            admin = {'Authorization': f'Bearer {admin_token}'}
+            tokens = {}
+            for i in random.sample(range(len(user_ids)), min(len(user_ids), args.logged_in)):
+                r = await client.post('/api/login', json={'username': f'bench{i}', 'password': BENCH_PASSWORD})
+                tokens[i] = r.json()['access_token']
+            user_headers = [{'Authorization': f'Bearer {t}'} for t in tokens.values()]
+            pending = list(request_ids)
+            random.shuffle(pending)
+            in_review = []
+            stats = Stats()
+            scenarios = [name for name, weight in MIX for _ in range(weight)]
+
+            async def call(scenario):
+                if scenario == 'login':
+                    i = random.randrange(len(user_ids))
+                    return await client.post('/api/login', json={'username': f'bench{i}', 'password': BENCH_PASSWORD})
+                if scenario == 'create_request':
+                    return await client.post('/api/requests', json={'secret_name': 'bench', 'reason': 'load'}, headers=random.choice(user_headers))
+                if scenario == 'list_requests':
+                    return await client.get('/api/requests', headers=random.choice(user_headers))
+                if scenario == 'list_requests_all':
+                    return await client.get('/api/requests?all=true', headers=admin)
+                if scenario == 'review_request' and pending:
+                    request_id = pending.pop()
+                    r = await client.post(f'/api/requests/{request_id}/review', headers=admin)
+                    in_review.append(request_id)
+                    return r
+                if scenario == 'approve_request' and (in_review or pending):
+                    request_id = in_review.pop() if in_review else pending.pop()
+                    return await client.post(f'/api/requests/{request_id}/approve', json={'secret_value': 'bench'}, headers=admin)
+                if scenario == 'notifications':
+                    return await client.get('/api/notifications?since=0', headers=random.choice(user_headers))
+                if scenario == 'audit':
+                    return await client.get('/api/audit?limit=100', headers=admin)
+                return None
+
+            stop_at = time.monotonic() + args.duration
+
+            async def worker():
+                while time.monotonic() < stop_at:
+                    scenario = random.choice(scenarios)
+                    start = time.perf_counter()
+                    r = await call(scenario)
+                    if r is not None:
+                        stats.record(scenario, time.perf_counter() - start, r.status_code)
+
+            started = time.monotonic()
+            await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+            return stats.report(time.monotonic() - started)
+
+
+def print_report(results, baseline=None):
+    print(f"{'endpoint':<20}{'count':>8}{'err':>6}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for scenario, r in results['endpoints'].items():
+        line = f"{scenario:<20}{r['count']:>8}{r['errors']:>6}{r['rps']:>10.1f}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}"
+        base = (baseline or {}).get('endpoints', {}).get(scenario)
+        if base:
+            line += f"   vs {baseline.get('revision') or 'baseline'}: req/s {r['rps'] / base['rps'] - 1:+.0%}, p99 {r['p99_ms'] / base['p99_ms'] - 1:+.0%}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--logged-in', type=int, default=50, help='Number of seeded users holding a session')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--use-env-db', action='store_true', help='Use DATABASE_URL instead of a temporary SQLite file')
+    parser.add_argument('--i-know-this-mutates', action='store_true', help='Confirm that --use-env-db may write to DATABASE_URL')
+    parser.add_argument('--output', help='Save results as JSON to this file')
+    parser.add_argument('--compare', help='Earlier results JSON to compare against')
+    args = parser.parse_args()
+    if args.use_env_db and not args.i_know_this_mutates:
+        parser.error('--use-env-db seeds users and requests in DATABASE_URL and approves requests (creating secrets); '
+                     'point it at a disposable database and add --i-know-this-mutates')
+
+    random.seed(args.seed)
+    tmpdir = tempfile.mkdtemp()
+    if not args.use_env_db:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmpdir, 'bench.sqlite')}"
+    os.environ.setdefault('USER_CACHE_STAMP', os.path.join(tmpdir, 'user_cache_stamp'))
+    os.environ.setdefault('SECRET_MASTER_KEY_FILE', os.path.join(tmpdir, 'master.key'))
+    # all simulated clients share one address and log in far more often than a person would
+    for name in ('LOGIN_IP_BURST', 'LOGIN_USER_BURST'):
+        os.environ.setdefault(name, '1000000')
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import main as app_main
+    from bootstrap import bootstrap
+
+    bootstrap(app_main, 'admin', 'password')
+    user_ids, request_ids = seed(app_main, args.users, args.requests)
+    endpoints = asyncio.run(run(app_main, args, user_ids, request_ids))
+
+    results = {
+        'revision': git_revision(),
+        'timestamp': datetime.utcnow().isoformat(),
+        'params': {k: v for k, v in vars(args).items() if k not in ('output', 'compare')},
+        'database': 'env' if args.use_env_db else 'sqlite-temp',
+        'endpoints': endpoints,
+    }
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print('Saved', args.output)
+
+
+if __name__ == '__main__':
+    main()
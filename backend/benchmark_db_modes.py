@@ -0,0 +1,146 @@
+"""Compare requests/sec and latency of the sync (threadpool) and async (DB_ASYNC) database paths.
+
+For each mode a uvicorn server is started on localhost against its own temporary SQLite
+database (or DATABASE_URL with --use-env-db), seeded with requests, and then driven by
+--concurrency concurrent clients for --duration seconds with a read-heavy mix of
+list_requests / notifications / create_request calls. --use-env-db writes to that database
+(migrations, an admin, seeded users and requests), so it also requires --i-know-this-mutates.
+
+Usage:
+python benchmark_db_modes.py --concurrency 64 --duration 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+MIX = [
+    ("GET", "/api/requests?limit=50", 6),
+    ("GET", "/api/requests?all=true&limit=50", 2),
+    ("GET", "/api/notifications?since=0", 3),
+    ("POST", "/api/requests", 1),
+]
+
+
+def percentile(samples, p):
+    if not samples:
+        return None
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(p * len(samples)))]
+
+
+async def wait_ready(base_url, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get('/api/health')).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError('server did not start')
+
+
+async def drive(base_url, concurrency, duration, seed_requests):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        await client.post('/api/register', json={'username': 'bench', 'password': 'bench'})
+        user_token = (await client.post('/api/login', json={'username': 'bench', 'password': 'bench'})).json()['access_token']
+        admin_token = (await client.post('/api/login', json={'username': 'admin', 'password': 'password'})).json()['access_token']
+        user = {'Authorization': f'Bearer {user_token}'}
+        admin = {'Authorization': f'Bearer {admin_token}'}
+        for i in range(seed_requests):
+            await client.post('/api/requests', json={'secret_name': f'seed-{i}'}, headers=user)
+
+        weighted = [(m, p) for m, p, w in MIX for _ in range(w)]
+        latencies = []
+        errors = 0
+        stop_at = time.monotonic() + duration
+
+        async def worker():
+            nonlocal errors
+            while time.monotonic() < stop_at:
+                method, path = random.choice(weighted)
+                headers = admin if 'all=true' in path else user
+                start = time.perf_counter()
+                if method == 'POST':
+                    r = await client.post(path, json={'secret_name': 'bench'}, headers=headers)
+                else:
+                    r = await client.get(path, headers=headers)
+                latencies.append(time.perf_counter() - start)
+                if r.status_code >= 400:
+                    errors += 1
+
+        started = time.monotonic()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.monotonic() - started
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+    }
+
+
+def run_mode(mode, args, port):
+    env = dict(os.environ)
+    env['DB_ASYNC'] = 'true' if mode == 'async' else 'false'
+    tmpdir = tempfile.mkdtemp()
+    env['USER_CACHE_STAMP'] = os.path.join(tmpdir, 'user_cache_stamp')
+    env.setdefault('SECRET_MASTER_KEY_FILE', os.path.join(tmpdir, 'master.key'))
+    if not args.use_env_db:
+        env['DATABASE_URL'] = f"sqlite:///{os.path.join(tmpdir, 'bench.sqlite')}"
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    subprocess.run(
+        [sys.executable, 'bootstrap.py', '--admin-password', 'password'], cwd=backend_dir, env=env, check=True, stdout=subprocess.DEVNULL,
+    )
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'main:app', '--port', str(port), '--log-level', 'warning'],
+        cwd=backend_dir,
+        env=env,
+    )
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        asyncio.run(wait_ready(base_url))
+        return asyncio.run(drive(base_url, args.concurrency, args.duration, args.seed_requests))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--seed-requests', type=int, default=200)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--modes', default='sync,async')
+    parser.add_argument('--use-env-db', action='store_true', help='Benchmark against DATABASE_URL instead of temporary SQLite files')
+    parser.add_argument('--i-know-this-mutates', action='store_true', help='Confirm that --use-env-db may write to DATABASE_URL')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+    if args.use_env_db and not args.i_know_this_mutates:
+        parser.error('--use-env-db migrates DATABASE_URL and seeds users and requests into it; '
+                     'point it at a disposable database and add --i-know-this-mutates')
+
+    results = {}
+    for i, mode in enumerate(args.modes.split(',')):
+        results[mode] = run_mode(mode, args, args.port + i)
+        r = results[mode]
+        print(f"{mode:>5}: {r['rps']:8.1f} req/s  p50 {r['p50_ms']:7.2f} ms  p99 {r['p99_ms']:7.2f} ms  ({r['requests']} requests, {r['errors']} errors)")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
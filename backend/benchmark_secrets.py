@@ -0,0 +1,95 @@
+"""Measure secret read latency with the data key cache on and off.
+
+Seals --secrets values with a local key provider (master key in a temporary file), then
+opens --reads random ones, once with a DataKeyCache of --cache-size entries and once with
+caching disabled. --unwrap-latency-ms adds a delay to every unwrap to approximate a remote
+KMS such as OpenBao, where each cache miss is a network round-trip.
+
+Usage:
+python benchmark_secrets.py --secrets 1000 --reads 20000 --unwrap-latency-ms 2
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from secret_crypto import DataKeyCache, LocalKeyProvider, SecretBox
+
+
+class SlowProvider:
+    """Wraps a provider, adding a fixed delay to each unwrap."""
+
+    def __init__(self, provider, latency: float):
+        self.provider = provider
+        self.name = provider.name
+        self.latency = latency
+
+    def generate_data_key(self):
+        return self.provider.generate_data_key()
+
+    def unwrap(self, wrapped):
+        time.sleep(self.latency)
+        return self.provider.unwrap(wrapped)
+
+
+def percentile(samples, p):
+    return samples[min(len(samples) - 1, int(p * len(samples)))]
+
+
+def run(box, sealed, reads, hot_fraction):
+    # a hot set of secrets receives most reads, like a few frequently fetched credentials
+    hot = sealed[:max(1, int(len(sealed) * hot_fraction))]
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(reads):
+        aad, stored = random.choice(hot if random.random() < 0.8 else sealed)
+        start = time.perf_counter()
+        box.decrypt(stored, aad)
+        latencies.append(time.perf_counter() - start)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'reads_per_second': reads / elapsed,
+        'p50_us': percentile(latencies, 0.50) * 1e6,
+        'p99_us': percentile(latencies, 0.99) * 1e6,
+        'cache': box.cache.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--secrets', type=int, default=1000)
+    parser.add_argument('--reads', type=int, default=20000)
+    parser.add_argument('--cache-size', type=int, default=1000)
+    parser.add_argument('--cache-ttl', type=float, default=300)
+    parser.add_argument('--hot-fraction', type=float, default=0.1, help='Share of secrets receiving 80%% of reads')
+    parser.add_argument('--unwrap-latency-ms', type=float, default=0)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    provider = LocalKeyProvider(os.path.join(tempfile.mkdtemp(), 'master.key'))
+    provider.create()
+    if args.unwrap_latency_ms:
+        provider = SlowProvider(provider, args.unwrap_latency_ms / 1000)
+    sealer = SecretBox(provider, DataKeyCache(max_entries=0))
+    sealed = []
+    for i in range(args.secrets):
+        aad = f'1:secret-{i}'
+        sealed.append((aad, sealer.encrypt(f'value-{i}', aad)))
+
+    results = {}
+    for mode, cache in (('cache', DataKeyCache(args.cache_size, args.cache_ttl)), ('no-cache', DataKeyCache(max_entries=0))):
+        results[mode] = r = run(SecretBox(provider, cache), sealed, args.reads, args.hot_fraction)
+        print(f"{mode:>8}: {r['reads_per_second']:10.0f} reads/s  p50 {r['p50_us']:8.1f} us  p99 {r['p99_us']:8.1f} us  hit ratio {r['cache']['hit_ratio'] or 0:.2f}")
+        cache.clear()
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Measure CPU time per list response: encoding the rows, then compressing the body.
+
+"before" is what FastAPI does for a route with response_model=List[RequestOut] returning plain
+rows: validate them into models, dump them back to JSON-compatible dicts, json.dumps the result.
+"after" is FastJSONResponse (orjson when installed) on the same rows. Rows are synthetic
+/api/requests rows; no database or server is involved. Compression is timed per encoding and
+level the CompressionMiddleware can use (brotli only when installed).
+
+Usage:
+python benchmark_serialization.py --rows 500 10000 50000 --repeat 5
+"""
+import argparse
+import gzip
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from responses import FastJSONResponse, brotli, orjson
+
+
+def make_rows(n):
+    start = datetime(2024, 1, 1, 9, 30)
+    return [
+        {
+            "id": i,
+            "requester_id": i % 250 + 1,
+            "requester_username": f"user{i % 250 + 1}",
+            "secret_name": f"service-{i % 40}/database-password",
+            "reason": "Rotating credentials for the nightly export job (ticket OPS-%d)" % (1000 + i % 500),
+            "status": ("pending", "in_review", "awaiting_admin", "approved", "denied")[i % 5],
+            "created_at": start + timedelta(seconds=37 * i, microseconds=i % 1000),
+            "resolved_at": start + timedelta(seconds=37 * i + 3600) if i % 5 >= 3 else None,
+            "admin_comment": "ok" if i % 5 == 3 else None,
+            "secret_id": i if i % 5 == 3 else None,
+        }
+        for i in range(n)
+    ]
+
+
+def cpu_ms(fn, repeat):
+    """Best-of-`repeat` process CPU time of fn(), in ms, and its last result."""
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.process_time()
+        result = fn()
+        elapsed = time.process_time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, nargs='+', default=[500, 10000, 50000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    # main only for the RequestOut model: point its stores at throwaway files
+    tmpdir = tempfile.mkdtemp()
+    os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(tmpdir, 'bench.sqlite')}")
+    os.environ.setdefault('USER_CACHE_STAMP', os.path.join(tmpdir, 'user_cache_stamp'))
+    os.environ.setdefault('SECRET_MASTER_KEY_FILE', os.path.join(tmpdir, 'master.key'))
+    from main import RequestOut
+
+    adapter = TypeAdapter(List[RequestOut])
+
+    def before(rows):
+        return JSONResponse(adapter.dump_python(adapter.validate_python(rows), mode='json')).body
+
+    def after(rows):
+        return FastJSONResponse(rows).body
+
+    print(f"encoder: {'orjson' if orjson else 'json (orjson not installed)'}; "
+          f"brotli: {'yes' if brotli else 'not installed'}; best of {args.repeat}, CPU ms per response")
+    print(f"{'rows':>7} {'before':>9} {'after':>9} {'speedup':>8} {'bytes':>10}")
+    bodies = {}
+    for n in args.rows:
+        rows = make_rows(n)
+        before_ms, before_body = cpu_ms(lambda: before(rows), args.repeat)
+        after_ms, after_body = cpu_ms(lambda: after(rows), args.repeat)
+        if before_body != after_body:
+            raise SystemExit(f'{n} rows: bodies differ')
+        bodies[n] = after_body
+        print(f'{n:>7} {before_ms:9.2f} {after_ms:9.2f} {before_ms / after_ms:7.1f}x {len(after_body):>10}')
+
+    codecs = [(f'gzip-{level}', lambda body, level=level: gzip.compress(body, level)) for level in (1, 5, 9)]
+    if brotli is not None:
+        codecs += [(f'br-{q}', lambda body, q=q: brotli.compress(body, quality=q)) for q in (1, 4, 11)]
+    print(f"\n{'rows':>7} {'codec':>8} {'cpu ms':>9} {'bytes':>10} {'ratio':>7}")
+    for n, body in bodies.items():
+        for name, compress in codecs:
+            ms, compressed = cpu_ms(lambda: compress(body), args.repeat)
+            print(f'{n:>7} {name:>8} {ms:9.2f} {len(compressed):>10} {len(body) / len(compressed):6.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Measure worker cold-start time: interpreter start, importing the app and its startup hooks.
+
+Each run starts a fresh Python process that imports main and runs the app's startup and
+shutdown events, against a temporary SQLite database (or DATABASE_URL with --use-env-db).
+Two scenarios: "fresh" (empty database, schema created on startup) and "current" (schema
+already at the latest version: the steady state of a rolling restart).
+
+Usage:
+python benchmark_startup.py --runs 5
+python benchmark_startup.py --importtime 15   # also list the packages slowest to import (python -X importtime)
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from secret_crypto import LocalKeyProvider
+
+CHILD = """
+import asyncio, json
+import main
+
+async def cycle():
+    await main.app.router.startup()
+    await main.app.router.shutdown()
+
+asyncio.run(cycle())
+print(json.dumps(main.startup_timings))
+"""
+
+
+def run_once(env, importtime=False):
+    cmd = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', CHILD]
+    start = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=os.path.dirname(os.path.abspath(__file__)), env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr)
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result['process_seconds'] = wall
+    return result, proc.stderr
+
+
+def slowest_imports(stderr, top):
+    """Import time per top-level package (summed self time of all its modules)."""
+    per_package = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        if not self_us.strip().isdigit():
+            continue
+        package = name.strip().split('.')[0]
+        per_package[package] = per_package.get(package, 0) + int(self_us)
+    return sorted(((us, package) for package, us in per_package.items()), reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--use-env-db', action='store_true', help='Use DATABASE_URL (only the "current" scenario)')
+    parser.add_argument('--importtime', type=int, metavar='N', help='List the N packages slowest to import')
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp()
+    base_env = dict(os.environ)
+    base_env.setdefault('USER_CACHE_STAMP', os.path.join(tmpdir, 'user_cache_stamp'))
+    base_env.setdefault('SECRET_MASTER_KEY_FILE', os.path.join(tmpdir, 'master.key'))
+    # workers refuse to start without one (bootstrap.py creates it in a real deployment)
+    LocalKeyProvider(base_env['SECRET_MASTER_KEY_FILE']).create()
+
+    scenarios = {}
+    if not args.use_env_db:
+        scenarios['fresh'] = [
+            dict(base_env, DATABASE_URL=f"sqlite:///{os.path.join(tmpdir, f'fresh{i}.sqlite')}") for i in range(args.runs)
+        ]
+        current_env = dict(base_env, DATABASE_URL=f"sqlite:///{os.path.join(tmpdir, 'current.sqlite')}")
+    else:
+        current_env = base_env
+    run_once(current_env)  # bring the shared database up to date first
+    scenarios['current'] = [current_env] * args.runs
+
+    # process: wall time of the whole child; startup: from importing main to the end of its startup hooks
+    columns = {
+        'process': 'process_seconds', 'startup': 'total_seconds', 'imports': 'import_seconds',
+        'schema': 'schema_seconds', 'stats': 'workflow_stats_seconds',
+    }
+    print(f"median ms over {args.runs} runs\n{'':>8} " + ''.join(f'{label:>10}' for label in columns))
+    for name, envs in scenarios.items():
+        results = [run_once(env)[0] for env in envs]
+        print(f'{name:>8} ' + ''.join(f'{statistics.median(r[key] for r in results) * 1000:10.1f}' for key in columns.values()))
+
+    if args.importtime:
+        _, stderr = run_once(current_env, importtime=True)
+        print('\nImport time by package (ms):')
+        for us, name in slowest_imports(stderr, args.importtime):
+            print(f'{us / 1000:9.1f}  {name}')
+
+
+if __name__ == '__main__':
+    main()
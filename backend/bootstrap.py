@@ -0,0 +1,124 @@
+"""Prepare the database for the API: apply schema migrations, create the local master key
+(SECRET_KEY_PROVIDER=local) and the first admin.
+
+python bootstrap.py                                   # migrate; create 'admin' with a generated password
+python bootstrap.py --admin-username root --admin-password secret
+python bootstrap.py --promote-existing                # a regular user already named 'admin' becomes the admin
+python bootstrap.py --status                          # print the schema version and exit
+
+Run it once per deployment, and after upgrades, before starting the API workers. Workers only
+compare the schema version at startup (and migrate themselves unless DB_AUTO_MIGRATE=false),
+but they never create users or master keys. The admin is only created if the database has no
+admin yet; the master key only if its file is missing and no secret was sealed with one.
+"""
+import argparse
+import os
+import secrets
+
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import SQLModel, Session, select
+
+from hashing import get_password_hash
+from migrations import LATEST_VERSION, MIGRATIONS, migrate, schema_version
+from secret_crypto import MasterKeyMissing, sealed_prefix
+
+
+def ensure_master_key(app_main) -> bool:
+    """Create the local master key file if missing; returns whether it did. Refuses (raises
+    MasterKeyMissing) when secrets sealed with a local key exist: they need the original file."""
+    provider = app_main.secret_box.provider
+    if not hasattr(provider, "create") or provider.exists():
+        return False
+    with Session(app_main.engine) as session:
+        statement = select(app_main.Secret.id).where(app_main.Secret.value.startswith(sealed_prefix(provider)))
+        if session.exec(statement.limit(1)).first() is not None:
+            raise MasterKeyMissing(
+                f"Master key file {provider.path} not found but sealed secrets exist: restore it instead of creating a new key"
+            )
+    return provider.create()
+
+
+class AdminNameTaken(ValueError):
+    pass
+
+
+def ensure_admin(app_main, username: str, password: str, promote: bool = False) -> bool:
+    """Create admin `username` unless some admin exists; returns whether one was created.
+
+    A regular user may already hold the name (anyone can register): that raises AdminNameTaken
+    unless `promote`, which makes that user the admin with `password`.
+    """
+    with Session(app_main.engine) as session:
+        if session.exec(select(app_main.User.id).where(app_main.User.is_admin == True)).first() is not None:  # noqa: E712
+            return False
+        existing = session.exec(select(app_main.User).where(app_main.User.username == username)).first()
+        if existing is not None and not promote:
+            raise AdminNameTaken(
+                f"User {username!r} exists but is not an admin: pass --promote-existing to make it the admin "
+                "(its password is reset), or choose another --admin-username"
+            )
+        promoted_id = existing.id if existing is not None else None
+        user = existing or app_main.User(username=username)
+        user.hashed_password = get_password_hash(password)
+        user.is_admin = True
+        session.add(user)
+        try:
+            session.commit()
+        except IntegrityError:
+            # registered between the check and the insert
+            raise AdminNameTaken(f"User {username!r} was registered concurrently; run bootstrap again") from None
+    if promoted_id is not None:
+        # cached authorization data of that user changed
+        app_main.user_cache.invalidate(promoted_id)
+    return True
+
+
+def bootstrap(app_main, admin_username: str, admin_password: str) -> bool:
+    """Migrate the schema, the master key and an admin (for scripts that run the app in-process)."""
+    migrate(app_main.engine, SQLModel.metadata)
+    ensure_master_key(app_main)
+    return ensure_admin(app_main, admin_username, admin_password)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--admin-username', default=os.getenv('ADMIN_USERNAME', 'admin'))
+    parser.add_argument('--admin-password', default=os.getenv('ADMIN_PASSWORD'), help='Default: generated and printed')
+    parser.add_argument('--promote-existing', action='store_true', help='Make an existing non-admin user of that name the admin')
+    parser.add_argument('--status', action='store_true', help='Only print the schema version')
+    args = parser.parse_args()
+
+    # importing the app registers every table in SQLModel.metadata
+    import main as app_main
+
+    version = schema_version(app_main.engine)
+    if args.status:
+        print(f'Schema version: {version if version is not None else "none"} (latest {LATEST_VERSION})')
+        for number, migration in enumerate(MIGRATIONS[version or 0:], (version or 0) + 1):
+            print(f'  pending {number}: {migration.description}')
+        return
+
+    applied = migrate(app_main.engine, SQLModel.metadata)
+    for description in applied:
+        print('Applied:', description)
+    print(f'Schema is at version {LATEST_VERSION}')
+
+    try:
+        if ensure_master_key(app_main):
+            print(f'Created master key {app_main.secret_box.provider.path}')
+    except MasterKeyMissing as exc:
+        raise SystemExit(str(exc))
+
+    password = args.admin_password or secrets.token_urlsafe(12)
+    try:
+        created = ensure_admin(app_main, args.admin_username, password, promote=args.promote_existing)
+    except AdminNameTaken as exc:
+        raise SystemExit(str(exc))
+    if created:
+        print(f'Admin {args.admin_username} is ready' + ('' if args.admin_password else f' with password {password}'))
+    else:
+        print('An admin already exists')
+
+
+if __name__ == '__main__':
+    main()
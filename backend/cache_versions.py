@@ -0,0 +1,165 @@
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Optional
+
+from sqlalchemy import event
+from sqlmodel import SQLModel, Field, Session, select
+
+# Change counters for conditional GETs. Writers bump the counters of what they changed
+# ("requests", "requests:<user id>", "audit"); readers build an ETag from the current counters
+# and answer a matching If-None-Match with 304 without running their query.
+# "memory" counts per process; "database" shares counters between workers through a table,
+# bumped inside the writer's transaction and read through a short-lived local cache.
+
+
+class CacheVersion(SQLModel, table=True):
+    key: str = Field(primary_key=True)
+    version: int = 0
+
+
+class MemoryVersionStore:
+    """Per-process counters. Bumps made through a Session apply only once it commits.
+
+    ETags carry a random per-process epoch, so tags issued before a restart never match.
+    """
+
+    def __init__(self):
+        self.epoch = uuid.uuid4().hex[:8]
+        self._lock = threading.Lock()
+        self._versions: dict[str, int] = {}
+        event.listen(Session, "after_commit", self._after_commit)
+        event.listen(Session, "after_rollback", self._after_rollback)
+
+    def bump(self, session: Session, *keys: str):
+        """Bump `keys` when `session` commits."""
+        session.info.setdefault("version_bumps", set()).update(keys)
+
+    def bump_now(self, *keys: str):
+        with self._lock:
+            for key in keys:
+                self._versions[key] = self._versions.get(key, 0) + 1
+
+    def _after_commit(self, session):
+        keys = session.info.pop("version_bumps", None)
+        if keys:
+            self.bump_now(*keys)
+
+    def _after_rollback(self, session):
+        session.info.pop("version_bumps", None)
+
+    def version(self, key: str) -> int:
+        with self._lock:
+            return self._versions.get(key, 0)
+
+    def etag(self, *keys: str, extra: str = "") -> str:
+        """Weak ETag over the current versions of `keys` plus `extra` (e.g. the query string)."""
+        state = "|".join(f"{key}={self.version(key)}" for key in keys)
+        digest = hashlib.sha1(f"{state}|{extra}".encode("utf-8")).hexdigest()[:16]
+        return f'W/"{self.epoch}-{digest}"'
+
+
+class DatabaseVersionStore(MemoryVersionStore):
+    """Counters shared by all workers via the `cacheversion` table.
+
+    `bump` increments the rows inside the caller's transaction, so the counter moves exactly
+    when the data does. Reads are cached locally for `cache_ttl` seconds: another worker's
+    change is visible within that window (this worker's own changes immediately).
+
+    Counters are read through `read_engine` (default `engine`): give it the engine the views
+    read their rows from. On a replica the counters replicate in the same transactions as the
+    data, so a tag is never newer than the rows it is sent with.
+    """
+
+    def __init__(self, engine, cache_ttl: float = 1.0, read_engine=None):
+        super().__init__()
+        # counters persist, so tags stay valid across restarts and workers
+        self.epoch = "db"
+        self.engine = engine
+        self.read_engine = read_engine if read_engine is not None else engine
+        self.cache_ttl = cache_ttl
+        self._cache: dict[str, tuple[int, float]] = {}
+
+    def _increment(self, session: Session, keys):
+        if session.bind.dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        # sorted, so concurrent transactions lock the rows in the same order
+        for key in sorted(keys):
+            stmt = insert(CacheVersion).values(key=key, version=1)
+            session.exec(stmt.on_conflict_do_update(index_elements=[CacheVersion.key], set_={"version": CacheVersion.version + 1}))
+
+    def bump(self, session: Session, *keys: str):
+        self._increment(session, keys)
+        session.info.setdefault("version_bumps", set()).update(keys)
+
+    def bump_now(self, *keys: str):
+        with Session(self.engine) as session:
+            self.bump(session, *keys)
+            session.commit()
+
+    def _after_commit(self, session):
+        keys = session.info.pop("version_bumps", None)
+        if keys:
+            with self._lock:
+                for key in keys:
+                    self._cache.pop(key, None)
+
+    def version(self, key: str) -> int:
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached[1] > time.monotonic():
+                return cached[0]
+        with Session(self.read_engine) as session:
+            version = session.exec(select(CacheVersion.version).where(CacheVersion.key == key)).first() or 0
+        with self._lock:
+            self._cache[key] = (version, time.monotonic() + self.cache_ttl)
+        return version
+
+
+def create_version_store(kind: str, engine, cache_ttl: float, read_engine=None):
+    if kind == "memory":
+        return MemoryVersionStore()
+    if kind == "database":
+        return DatabaseVersionStore(engine, cache_ttl=cache_ttl, read_engine=read_engine)
+    raise ValueError(f"Unknown cache version store: {kind}")
+
+
+class ResponseCache:
+    """Computed responses by key (which should include the ETag) for `ttl` seconds, LRU-bounded."""
+
+    def __init__(self, ttl: float = 5.0, max_entries: int = 256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[Any, float]] = OrderedDict()
+        # metrics
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: str, value: Any):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
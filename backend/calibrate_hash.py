@@ -0,0 +1,68 @@
+"""Pick password-hash parameters for a target verify time on this host.
+
+Times the configured scheme on this machine and prints the environment settings that make a
+single verify take about --target-ms. Apply them to the API (and create_user.py); existing
+users are rehashed with the new parameters the next time they log in.
+
+Usage:
+python calibrate_hash.py --target-ms 250
+python calibrate_hash.py --scheme scrypt --target-ms 100
+"""
+import argparse
+import time
+
+from hashing import SCRYPT_P, SCRYPT_R, hash_with
+
+
+def time_hash(scheme: str, params: str, rounds: int) -> float:
+    """Best of `rounds` timings, to filter out scheduling noise."""
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        hash_with('calibration-password', scheme, params)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def calibrate_pbkdf2(target: float, rounds: int) -> tuple[dict, float]:
+    # PBKDF2 cost is linear in the iteration count: measure once and scale
+    probe = 50_000
+    per_iteration = time_hash('pbkdf2_sha256', str(probe), rounds) / probe
+    iterations = max(10_000, int(round(target / per_iteration, -3)))
+    return {'HASH_SCHEME': 'pbkdf2_sha256', 'PBKDF2_ITERATIONS': iterations}, time_hash('pbkdf2_sha256', str(iterations), rounds)
+
+
+def calibrate_scrypt(target: float, rounds: int, r: int, p: int) -> tuple[dict, float]:
+    # n must be a power of two: take the largest one that stays within the target
+    n = 2 ** 12
+    elapsed = time_hash('scrypt', f'{n}:{r}:{p}', rounds)
+    while True:
+        next_elapsed = time_hash('scrypt', f'{n * 2}:{r}:{p}', rounds)
+        if next_elapsed > target:
+            break
+        n, elapsed = n * 2, next_elapsed
+    return {'HASH_SCHEME': 'scrypt', 'SCRYPT_N': n, 'SCRYPT_R': r, 'SCRYPT_P': p}, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scheme', choices=('pbkdf2_sha256', 'scrypt'), default='pbkdf2_sha256')
+    parser.add_argument('--target-ms', type=float, default=250, help='Desired time of one hash/verify')
+    parser.add_argument('--rounds', type=int, default=3, help='Timings per measurement (best is used)')
+    parser.add_argument('--scrypt-r', type=int, default=SCRYPT_R)
+    parser.add_argument('--scrypt-p', type=int, default=SCRYPT_P)
+    args = parser.parse_args()
+
+    target = args.target_ms / 1000
+    if args.scheme == 'scrypt':
+        settings, elapsed = calibrate_scrypt(target, args.rounds, args.scrypt_r, args.scrypt_p)
+    else:
+        settings, elapsed = calibrate_pbkdf2(target, args.rounds)
+
+    print(f'# {args.scheme}: {elapsed * 1000:.1f} ms per hash on this host (target {args.target_ms:.0f} ms)')
+    for name, value in settings.items():
+        print(f'{name}={value}')
+
+
+if __name__ == '__main__':
+    main()
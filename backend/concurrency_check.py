@@ -0,0 +1,83 @@
+"""Hammer workflow transitions from many threads and check that exactly one wins.
+
+Runs the app in-process against a throwaway SQLite database (or DATABASE_URL if --use-env-db,
+which writes users, requests and secrets to it and so also requires --i-know-this-mutates).
+Each round creates a request and fires approve/deny at it from --threads threads at once;
+afterwards the request must have exactly one successful transition and at most one Secret.
+
+Usage:
+python concurrency_check.py --threads 32 --rounds 20
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+from collections import Counter
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--use-env-db', action='store_true', help='Use DATABASE_URL instead of a temporary SQLite file')
+    parser.add_argument('--i-know-this-mutates', action='store_true', help='Confirm that --use-env-db may write to DATABASE_URL')
+    args = parser.parse_args()
+    if args.use_env_db and not args.i_know_this_mutates:
+        parser.error('--use-env-db migrates DATABASE_URL and writes users, requests and secrets into it; '
+                     'point it at a disposable database and add --i-know-this-mutates')
+
+    if not args.use_env_db:
+        tmpdir = tempfile.mkdtemp()
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmpdir, 'concurrency.sqlite')}"
+
+    from fastapi.testclient import TestClient
+    from sqlmodel import Session, select
+    import main as app_main
+    from bootstrap import bootstrap
+
+    bootstrap(app_main, 'admin', 'password')
+    failures = 0
+    with TestClient(app_main.app) as client:
+        client.post('/api/register', json={'username': 'concurrency_user', 'password': 'password'})
+        user_token = client.post('/api/login', json={'username': 'concurrency_user', 'password': 'password'}).json()['access_token']
+        admin_token = client.post('/api/login', json={'username': 'admin', 'password': 'password'}).json()['access_token']
+        user_headers = {'Authorization': f'Bearer {user_token}'}
+        admin_headers = {'Authorization': f'Bearer {admin_token}'}
+
+        for round_no in range(args.rounds):
+            request_id = client.post('/api/requests', json={'secret_name': f'race-{round_no}'}, headers=user_headers).json()['id']
+            barrier = threading.Barrier(args.threads)
+            codes = Counter()
+            lock = threading.Lock()
+
+            def worker(i):
+                barrier.wait()
+                if i % 2:
+                    r = client.post(f'/api/requests/{request_id}/approve', json={'secret_value': f'value-{i}'}, headers=admin_headers)
+                else:
+                    r = client.post(f'/api/requests/{request_id}/deny', json={'comment': f'deny-{i}'}, headers=admin_headers)
+                with lock:
+                    codes[r.status_code] += 1
+
+            threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+            with Session(app_main.engine) as session:
+                req = session.get(app_main.SecretRequest, request_id)
+                secrets = session.exec(select(app_main.Secret).where(app_main.Secret.name == f'race-{round_no}')).all()
+            expected_secrets = 1 if req.status == 'approved' else 0
+            ok = codes[200] == 1 and len(secrets) == expected_secrets and set(codes) <= {200, 400, 409}
+            if not ok:
+                failures += 1
+            print(f"round {round_no}: status={req.status} responses={dict(codes)} secrets={len(secrets)} {'OK' if ok else 'FAIL'}")
+
+    print('Done.' if not failures else f'{failures} round(s) failed')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
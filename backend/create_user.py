@@ -1,42 +1,140 @@
+"""Create or update users.
+
+Single user:
+python create_user.py --username alice --password secret [--admin]
+
+Bulk (CSV with a header row, or JSON lines; columns username, password, optional is_admin):
+python create_user.py --file users.csv
+cat users.jsonl | python create_user.py --file - --format jsonl --workers 8 --batch-size 1000
+
+Bulk mode reads the input --batch-size users at a time, hashes their passwords in parallel
+across --workers processes and upserts them in one INSERT ... ON CONFLICT (username) DO UPDATE
+statement, so memory stays bounded however large the input is.
+"""
 import os
 import argparse
-from typing import Optional
+import csv
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Iterator, Optional
 
-from sqlmodel import SQLModel, Field, create_engine, Session, select
-import hashlib
-import binascii
+from sqlmodel import SQLModel, Field, Session, select
 
-SALT_BYTES = 16
-PBKDF2_ITERATIONS = 200_000
+from database import make_engine
+from hashing import get_password_hash
+from migrations import LATEST_VERSION, schema_version
+from user_cache import touch_stamp
 
 
 class User(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    username: str = Field(index=True)
+    username: str = Field(index=True, unique=True)
     hashed_password: str
     is_admin: bool = False
 
 
-def get_password_hash(password: str) -> str:
-    salt = os.urandom(SALT_BYTES)
-    dk = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, PBKDF2_ITERATIONS)
-    return f"pbkdf2_sha256${PBKDF2_ITERATIONS}${binascii.hexlify(salt).decode()}${binascii.hexlify(dk).decode()}"
+def check_schema(engine):
+    # tables are created and migrated by bootstrap.py (or the API on startup), never here
+    version = schema_version(engine)
+    if version != LATEST_VERSION:
+        sys.exit(f'Database schema is at version {version or 0}, expected {LATEST_VERSION}: run python bootstrap.py first')
+
+
+def parse_bool(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    return str(value or '').strip().lower() in ('1', 'true', 'yes', 'y')
+
+
+def read_users(f, fmt: str) -> Iterator[dict]:
+    rows = csv.DictReader(f) if fmt == 'csv' else (json.loads(line) for line in f if line.strip())
+    for line_no, row in enumerate(rows, 1):
+        if not row.get('username') or not row.get('password'):
+            print(f'Skipping record {line_no}: username and password are required', file=sys.stderr)
+            continue
+        yield {'username': row['username'].strip(), 'password': row['password'], 'is_admin': parse_bool(row.get('is_admin'))}
+
+
+def upsert_users(session: Session, batch: list[dict]):
+    """Insert `batch` or update existing users' password and admin flag, in one statement."""
+    if session.bind.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    # ON CONFLICT cannot touch the same row twice in one statement: last record wins
+    rows = list({row['username']: row for row in batch}.values())
+    stmt = insert(User).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[User.username],
+        set_={'hashed_password': stmt.excluded.hashed_password, 'is_admin': stmt.excluded.is_admin},
+    )
+    session.exec(stmt)
+    session.commit()
+
+
+def bulk_create(engine, users: Iterator[dict], workers: int, batch_size: int):
+    start = time.perf_counter()
+    done = 0
+
+    def flush(batch):
+        nonlocal done
+        with Session(engine) as session:
+            upsert_users(session, batch)
+        done += len(batch)
+        elapsed = time.perf_counter() - start
+        print(f'{done} users written ({done / elapsed:.1f} users/s)', file=sys.stderr)
+
+    chunksize = max(1, min(64, batch_size // workers))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # at most two chunks in memory: the previous one is written while this one is hashed
+        hashed_batch = None
+        for chunk in iter(lambda: list(islice(users, batch_size)), []):
+            hashes = pool.map(get_password_hash, (u['password'] for u in chunk), chunksize=chunksize)
+            if hashed_batch:
+                flush(hashed_batch)
+            hashed_batch = [
+                {'username': user['username'], 'hashed_password': hashed, 'is_admin': user['is_admin']}
+                for user, hashed in zip(chunk, hashes)
+            ]
+        if hashed_batch:
+            flush(hashed_batch)
+
+    # running API workers cache users; make them reload updated ones
+    touch_stamp()
+    elapsed = time.perf_counter() - start
+    print(f'Done: {done} users in {elapsed:.1f}s ({done / elapsed if elapsed else 0:.1f} users/s, {workers} workers)')
 
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument('--username', required=True)
-    parser.add_argument('--password', required=True)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--username')
+    source.add_argument('--file', help="CSV or JSONL file of users, '-' for stdin")
+    parser.add_argument('--password')
     parser.add_argument('--admin', action='store_true')
+    parser.add_argument('--format', choices=('csv', 'jsonl'), help='Input format (default: from the file extension, csv for stdin)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Hashing processes')
+    parser.add_argument('--batch-size', type=int, default=500, help='Users per upsert transaction')
     args = parser.parse_args()
 
-    DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///./db.sqlite')
-    if DATABASE_URL.startswith('sqlite'):
-        engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-    else:
-        engine = create_engine(DATABASE_URL)
+    engine = make_engine()
+
+    check_schema(engine)
+
+    if args.file:
+        fmt = args.format or ('jsonl' if args.file.endswith(('.jsonl', '.ndjson')) else 'csv')
+        if args.file == '-':
+            bulk_create(engine, read_users(sys.stdin, fmt), args.workers, args.batch_size)
+        else:
+            with open(args.file, newline='', encoding='utf-8') as f:
+                bulk_create(engine, read_users(f, fmt), args.workers, args.batch_size)
+        return
 
-    SQLModel.metadata.create_all(engine)
+    if not args.password:
+        parser.error('--password is required with --username')
 
     with Session(engine) as session:
         statement = select(User).where(User.username == args.username)
@@ -47,6 +145,8 @@ def main():
             existing.is_admin = args.admin
             session.add(existing)
             session.commit()
+            # running API workers cache users; make them reload this one
+            touch_stamp()
             print('Updated user', args.username)
             return
 
@@ -0,0 +1,154 @@
+import os
+from contextlib import asynccontextmanager
+from typing import Union
+
+from sqlalchemy import event, make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import Session, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+# Engine configuration shared by the API and the maintenance scripts.
+# SQLite gets a production profile (WAL, tuned pragmas) applied on every new connection;
+# both backends get explicit pool sizing. Read-only engines back the list endpoints.
+# With DB_ASYNC=true the API talks to the database through async drivers (aiosqlite / asyncpg).
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./db.sqlite")
+# optional replica for read-only traffic; defaults to the primary
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL", DATABASE_URL)
+
+DB_ASYNC = os.getenv("DB_ASYNC", "false").lower() in ("1", "true", "yes")
+
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"),
+    "mmap_size": os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)),
+    # negative = KiB
+    "cache_size": os.getenv("SQLITE_CACHE_SIZE", str(-64 * 1024)),
+    "temp_store": "MEMORY",
+}
+
+
+def is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+def _apply_sqlite_pragmas(engine, read_only: bool):
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+
+
+def make_engine(url: str = DATABASE_URL, read_only: bool = False, **kwargs):
+    """Create an engine for `url` with this project's pool and connection settings."""
+    if is_sqlite(url):
+        engine = create_engine(
+            url,
+            connect_args={"check_same_thread": False},
+            pool_size=POOL_SIZE,
+            max_overflow=MAX_OVERFLOW,
+            pool_timeout=POOL_TIMEOUT,
+            **kwargs,
+        )
+        _apply_sqlite_pragmas(engine, read_only)
+        return engine
+    connect_args = {}
+    if read_only:
+        connect_args["options"] = "-c default_transaction_read_only=on"
+    return create_engine(
+        url,
+        connect_args=connect_args,
+        pool_size=POOL_SIZE,
+        max_overflow=MAX_OVERFLOW,
+        pool_timeout=POOL_TIMEOUT,
+        pool_recycle=POOL_RECYCLE,
+        pool_pre_ping=True,
+        **kwargs,
+    )
+
+
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+
+def make_async_engine(url: str = DATABASE_URL, read_only: bool = False, **kwargs):
+    """Async counterpart of make_engine, using the aiosqlite / asyncpg drivers."""
+    sa_url = make_url(url)
+    sa_url = sa_url.set(drivername=ASYNC_DRIVERS[sa_url.get_backend_name()])
+    if is_sqlite(url):
+        engine = create_async_engine(
+            sa_url,
+            pool_size=POOL_SIZE,
+            max_overflow=MAX_OVERFLOW,
+            pool_timeout=POOL_TIMEOUT,
+            **kwargs,
+        )
+        _apply_sqlite_pragmas(engine.sync_engine, read_only)
+        return engine
+    connect_args = {}
+    if read_only:
+        connect_args["server_settings"] = {"default_transaction_read_only": "on"}
+    return create_async_engine(
+        sa_url,
+        connect_args=connect_args,
+        pool_size=POOL_SIZE,
+        max_overflow=MAX_OVERFLOW,
+        pool_timeout=POOL_TIMEOUT,
+        pool_recycle=POOL_RECYCLE,
+        pool_pre_ping=True,
+        **kwargs,
+    )
+
+
+class SyncDatabase:
+    """Request-scoped database handle over a blocking Session.
+
+    `run(fn, *args)` calls `fn(session, *args)` in the threadpool.
+    """
+
+    def __init__(self, session: Session):
+        self.session = session
+
+    async def run(self, fn, *args, **kwargs):
+        return await run_in_threadpool(fn, self.session, *args, **kwargs)
+
+
+class AsyncDatabase:
+    """Request-scoped database handle over an AsyncSession.
+
+    `run(fn, *args)` calls the same `fn(session, *args)` through AsyncSession.run_sync,
+    so its I/O goes through the async driver on the event loop instead of a thread.
+    """
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def run(self, fn, *args, **kwargs):
+        return await self.session.run_sync(fn, *args, **kwargs)
+
+
+Database = Union[SyncDatabase, AsyncDatabase]
+
+
+@asynccontextmanager
+async def open_database(engine, async_engine=None):
+    """Open a SyncDatabase on `engine`, or an AsyncDatabase on `async_engine` when given."""
+    if async_engine is not None:
+        async with AsyncSession(async_engine) as session:
+            yield AsyncDatabase(session)
+    else:
+        session = Session(engine)
+        try:
+            yield SyncDatabase(session)
+        finally:
+            await run_in_threadpool(session.close)
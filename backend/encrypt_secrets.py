@@ -0,0 +1,45 @@
+"""Encrypt Secret rows still stored in plaintext (created before encryption at rest).
+
+Uses the same key provider settings as the API (SECRET_KEY_PROVIDER, SECRET_MASTER_KEY_FILE, ...).
+Rows are processed in --batch-size chunks, each in its own transaction; already encrypted
+rows are skipped, so the script can be re-run safely.
+
+Usage:
+python encrypt_secrets.py [--batch-size 500] [--dry-run]
+"""
+import argparse
+
+from sqlmodel import Session, select
+
+from main import Secret, engine, secret_aad, secret_box
+from secret_crypto import PREFIX
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--dry-run', action='store_true', help='Only count plaintext rows')
+    args = parser.parse_args()
+
+    encrypted = 0
+    last_id = 0
+    while True:
+        with Session(engine) as session:
+            rows = session.exec(
+                select(Secret).where(Secret.id > last_id, ~Secret.value.startswith(PREFIX)).order_by(Secret.id).limit(args.batch_size)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            if not args.dry_run:
+                for secret in rows:
+                    secret.value = secret_box.encrypt(secret.value, secret_aad(secret))
+                    session.add(secret)
+                session.commit()
+            encrypted += len(rows)
+            print(f'{encrypted} secrets {"found" if args.dry_run else "encrypted"}')
+    print('Done:', encrypted, 'plaintext secrets', 'found' if args.dry_run else 'encrypted')
+
+
+if __name__ == '__main__':
+    main()
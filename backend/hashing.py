@@ -0,0 +1,196 @@
+import asyncio
+import binascii
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+# Password hashing (PBKDF2-SHA256 or scrypt) and a bounded process pool to keep it off the request threadpool
+
+SALT_BYTES = 16
+
+# HASH_SCHEME selects the scheme for new hashes (pbkdf2_sha256 or scrypt). Stored hashes carry their
+# own parameters, so changing these only affects new hashes and rehash-on-login (see needs_rehash).
+# Run calibrate_hash.py to pick values for a target verify time on this host.
+HASH_SCHEME = os.getenv("HASH_SCHEME", "pbkdf2_sha256")
+PBKDF2_ITERATIONS = int(os.getenv("PBKDF2_ITERATIONS", "200000"))
+SCRYPT_N = int(os.getenv("SCRYPT_N", str(2 ** 14)))
+SCRYPT_R = int(os.getenv("SCRYPT_R", "8"))
+SCRYPT_P = int(os.getenv("SCRYPT_P", "1"))
+
+# Stored formats:
+#   pbkdf2_sha256$<iterations>$<salt hex>$<hash hex>
+#   scrypt$<n>:<r>:<p>$<salt hex>$<hash hex>
+
+
+def _pbkdf2(password: str, salt: bytes, iterations: int) -> bytes:
+    return hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, iterations)
+
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    # hashlib's default maxmem (32 MiB) is below what n=2**15, r=8 needs
+    return hashlib.scrypt(password.encode("utf-8"), salt=salt, n=n, r=r, p=p, maxmem=256 * n * r * p + 2 ** 20, dklen=32)
+
+
+def current_params(scheme: str = HASH_SCHEME) -> str:
+    if scheme == "pbkdf2_sha256":
+        return str(PBKDF2_ITERATIONS)
+    if scheme == "scrypt":
+        return f"{SCRYPT_N}:{SCRYPT_R}:{SCRYPT_P}"
+    raise ValueError(f"Unknown HASH_SCHEME: {scheme}")
+
+
+def _derive(password: str, salt: bytes, scheme: str, params: str) -> bytes:
+    if scheme == "pbkdf2_sha256":
+        return _pbkdf2(password, salt, int(params))
+    if scheme == "scrypt":
+        n, r, p = (int(x) for x in params.split(":"))
+        return _scrypt(password, salt, n, r, p)
+    raise ValueError(f"Unknown hash scheme: {scheme}")
+
+
+def hash_with(password: str, scheme: str, params: str) -> str:
+    salt = os.urandom(SALT_BYTES)
+    dk = _derive(password, salt, scheme, params)
+    return f"{scheme}${params}${binascii.hexlify(salt).decode()}${binascii.hexlify(dk).decode()}"
+
+
+def get_password_hash(password: str) -> str:
+    return hash_with(password, HASH_SCHEME, current_params())
+
+
+def verify_password(plain_password: str, stored_hash: str) -> bool:
+    try:
+        scheme, params, salt_hex, hash_hex = stored_hash.split("$", 3)
+        salt = binascii.unhexlify(salt_hex)
+        expected = binascii.unhexlify(hash_hex)
+        dk = _derive(plain_password, salt, scheme, params)
+        return hmac.compare_digest(dk, expected)
+    except Exception:
+        return False
+
+
+def needs_rehash(stored_hash: str) -> bool:
+    """True if `stored_hash` was made with another scheme or other parameters than the current ones."""
+    scheme, _, rest = stored_hash.partition("$")
+    return scheme != HASH_SCHEME or rest.partition("$")[0] != current_params()
+
+
+# verified against for unknown usernames, so a miss costs the same as a wrong password
+DUMMY_HASH = f"{HASH_SCHEME}${current_params()}${os.urandom(SALT_BYTES).hex()}${os.urandom(32).hex()}"
+
+
+def verify_and_update(plain_password: str, stored_hash: str) -> tuple[bool, Optional[str]]:
+    """Verify, and on success with outdated parameters also return a fresh hash to store.
+
+    Runs as one job in the hashing pool so a login needing a rehash costs a single round-trip.
+    """
+    if not verify_password(plain_password, stored_hash):
+        return False, None
+    if needs_rehash(stored_hash):
+        return True, get_password_hash(plain_password)
+    return True, None
+
+
+class HashingBusy(Exception):
+    """Raised when the hashing queue is full; the caller should retry after `retry_after` seconds."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Password hashing queue is full")
+        self.retry_after = retry_after
+
+
+class HashingExecutor:
+    """Process pool for PBKDF2 work with a bounded number of queued + running jobs.
+
+    Submissions beyond `max_pending` fail fast with HashingBusy instead of piling up,
+    so a login burst cannot grow an unbounded backlog.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, max_pending: Optional[int] = None, retry_after: int = 1):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.max_workers * 4
+        self.retry_after = retry_after
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        # metrics
+        self.completed = 0
+        self.rejected = 0
+        self.total_seconds = 0.0
+        self._latencies: deque[float] = deque(maxlen=1024)
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._pool
+
+    async def run(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise HashingBusy(self.retry_after)
+            self._pending += 1
+        start = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_pool(), fn, *args)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._pending -= 1
+                self.completed += 1
+                self.total_seconds += elapsed
+                self._latencies.append(elapsed)
+
+    async def hash(self, password: str) -> str:
+        return await self.run(get_password_hash, password)
+
+    async def verify(self, plain_password: str, stored_hash: str) -> bool:
+        return await self.run(verify_password, plain_password, stored_hash)
+
+    async def verify_and_update(self, plain_password: str, stored_hash: str) -> tuple[bool, Optional[str]]:
+        return await self.run(verify_and_update, plain_password, stored_hash)
+
+    def stats(self) -> dict:
+        with self._lock:
+            samples = sorted(self._latencies)
+            pending = self._pending
+
+        def percentile(p: float) -> Optional[float]:
+            if not samples:
+                return None
+            return samples[min(len(samples) - 1, int(p * len(samples)))]
+
+        return {
+            "workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "pending": pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "total_seconds": self.total_seconds,
+            "p50_seconds": percentile(0.50),
+            "p99_seconds": percentile(0.99),
+        }
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+
+def _env_int(name: str) -> Optional[int]:
+    value = os.getenv(name)
+    return int(value) if value else None
+
+
+hashing_executor = HashingExecutor(
+    max_workers=_env_int("HASH_WORKERS"),
+    max_pending=_env_int("HASH_QUEUE_SIZE"),
+)
@@ -1,23 +1,314 @@
-import sqlite3, os, sys
-p = 'db.sqlite'
-if not os.path.exists(p):
-    print('NO DB', p)
-    sys.exit(0)
-conn = sqlite3.connect(p)
-cur = conn.cursor()
-print('TABLES:')
-for row in cur.execute("SELECT name FROM sqlite_master WHERE type='table'"):
-    print(' -', row[0])
-print('\nTRY user table queries:')
-queries = ["SELECT id, username, hashed_password, is_admin FROM 'user'", "SELECT id, username, hashed_password, is_admin FROM user"]
-for q in queries:
-    try:
-        cur.execute(q)
-        rows = cur.fetchall()
-        print('QUERY OK ->', q)
-        for r in rows:
-            print(r)
-        break
-    except Exception as e:
-        print('QUERY FAILED ->', q, 'ERR:', e)
-conn.close()
\ No newline at end of file
+"""Database diagnostics: table and index sizes, query plans of the API's queries, index advice.
+
+Works on the SQLite and PostgreSQL URLs the API supports (DATABASE_URL, or --url).
+
+python inspect_db.py                  # sizes, plans of every query shape, suggestions
+python inspect_db.py --plans-only --verbose
+python inspect_db.py --analyze        # refresh planner statistics first (ANALYZE)
+python inspect_db.py --vacuum         # then reclaim free pages (SQLite) / dead rows (PostgreSQL)
+
+For every query shape the API issues (see QUERY_SHAPES) the plan is checked for full table
+scans and explicit sorts, and an index is suggested when no existing index starts with the
+columns the query filters and orders by. Sample parameter values are taken from the data,
+so on PostgreSQL the plans reflect the current statistics.
+"""
+import argparse
+import json
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from sqlalchemy import inspect, text
+
+from database import DATABASE_URL, make_engine
+
+
+@dataclass
+class QueryShape:
+    name: str
+    table: str
+    sql: str
+    # columns an index must start with to serve the filter and the ORDER BY without a sort
+    index: tuple
+
+
+REQUEST_COLUMNS = 'SELECT r.*, u.username FROM secretrequest r LEFT OUTER JOIN "user" u ON u.id = r.requester_id'
+REQUEST_ORDER = 'ORDER BY r.created_at DESC, r.id DESC LIMIT 101'
+REQUEST_CURSOR = '(r.created_at, r.id) < (:cursor_created_at, :cursor_id)'
+AUDIT_ORDER = 'ORDER BY created_at DESC, id DESC LIMIT 101'
+SECRET_COLUMNS = 'SELECT s.id, s.name, s.owner_id, s.created_at, u.username FROM secret s LEFT OUTER JOIN "user" u ON u.id = s.owner_id'
+SECRET_ORDER = 'ORDER BY s.created_at DESC, s.id DESC LIMIT 101'
+
+QUERY_SHAPES = [
+    QueryShape('login: user by username', 'user', 'SELECT * FROM "user" WHERE username = :username', ('username',)),
+    QueryShape('list_requests: own', 'secretrequest', f'{REQUEST_COLUMNS} WHERE r.requester_id = :requester_id {REQUEST_ORDER}', ('requester_id', 'created_at')),
+    QueryShape(
+        'list_requests: own, by status', 'secretrequest',
+        f'{REQUEST_COLUMNS} WHERE r.requester_id = :requester_id AND r.status = :status {REQUEST_ORDER}', ('requester_id', 'created_at'),
+    ),
+    QueryShape(
+        'list_requests: own, next page', 'secretrequest',
+        f'{REQUEST_COLUMNS} WHERE r.requester_id = :requester_id AND {REQUEST_CURSOR} {REQUEST_ORDER}', ('requester_id', 'created_at'),
+    ),
+    QueryShape('list_requests: all', 'secretrequest', f'{REQUEST_COLUMNS} {REQUEST_ORDER}', ('created_at',)),
+    QueryShape('list_requests: all, next page', 'secretrequest', f'{REQUEST_COLUMNS} WHERE {REQUEST_CURSOR} {REQUEST_ORDER}', ('created_at',)),
+    QueryShape('list_requests: all, by status', 'secretrequest', f'{REQUEST_COLUMNS} WHERE r.status = :status {REQUEST_ORDER}', ('status', 'created_at')),
+    QueryShape('bulk workflow: requests by id', 'secretrequest', 'SELECT * FROM secretrequest WHERE id IN (:request_id, :cursor_id)', ('id',)),
+    QueryShape('audit: newest', 'auditlog', f'SELECT * FROM auditlog {AUDIT_ORDER}', ('created_at',)),
+    QueryShape(
+        'audit: next page', 'auditlog',
+        f'SELECT * FROM auditlog WHERE (created_at, id) < (:cursor_created_at, :cursor_id) {AUDIT_ORDER}', ('created_at',),
+    ),
+    QueryShape('audit: by user', 'auditlog', f'SELECT * FROM auditlog WHERE user_id = :requester_id {AUDIT_ORDER}', ('user_id', 'created_at')),
+    QueryShape('audit: by action', 'auditlog', f'SELECT * FROM auditlog WHERE action = :action {AUDIT_ORDER}', ('action', 'created_at')),
+    QueryShape(
+        'audit: time range', 'auditlog',
+        f'SELECT * FROM auditlog WHERE created_at >= :since AND created_at < :until {AUDIT_ORDER}', ('created_at',),
+    ),
+    QueryShape('secrets: all', 'secret', f'{SECRET_COLUMNS} {SECRET_ORDER}', ('created_at',)),
+    QueryShape('secrets: by owner', 'secret', f'{SECRET_COLUMNS} WHERE s.owner_id = :requester_id {SECRET_ORDER}', ('owner_id', 'created_at')),
+    QueryShape('secrets: by name', 'secret', f'{SECRET_COLUMNS} WHERE s.name = :secret_name {SECRET_ORDER}', ('name',)),
+    QueryShape(
+        'notifications: since id', 'notification',
+        'SELECT * FROM notification WHERE user_id = :requester_id AND id > :cursor_id ORDER BY id LIMIT 100', ('user_id', 'id'),
+    ),
+    QueryShape('sessions: purge expired', 'authsession', 'SELECT token_hash FROM authsession WHERE expires_at <= :until', ('expires_at',)),
+    QueryShape(
+        'login throttle: purge idle', 'loginthrottle',
+        'SELECT key FROM loginthrottle WHERE updated_at < :idle_before AND blocked_until < :idle_before', ('updated_at',),
+    ),
+]
+
+
+def sample_params(conn) -> dict:
+    """Representative values: the most frequent requester / status / action, the newest request."""
+    def first(sql, default):
+        try:
+            value = conn.execute(text(sql)).scalar()
+        except Exception:
+            conn.rollback()
+            return default
+        return default if value is None else value
+
+    now = datetime.utcnow()
+    return {
+        'username': first('SELECT username FROM "user" LIMIT 1', 'admin'),
+        'requester_id': first('SELECT requester_id FROM secretrequest GROUP BY requester_id ORDER BY COUNT(*) DESC LIMIT 1', 1),
+        'status': first('SELECT status FROM secretrequest GROUP BY status ORDER BY COUNT(*) DESC LIMIT 1', 'pending'),
+        'action': first('SELECT action FROM auditlog GROUP BY action ORDER BY COUNT(*) DESC LIMIT 1', 'create_request'),
+        'secret_name': first('SELECT name FROM secret LIMIT 1', 'secret'),
+        'request_id': first('SELECT MAX(id) FROM secretrequest', 1),
+        'cursor_id': first('SELECT MAX(id) FROM secretrequest', 1),
+        'cursor_created_at': first('SELECT MAX(created_at) FROM secretrequest', now),
+        'since': now - timedelta(days=7),
+        'until': now,
+        'idle_before': now.timestamp() - 24 * 3600,
+    }
+
+
+def explain(conn, shape: QueryShape, params: dict, analyze: bool) -> tuple[list[str], list[str]]:
+    """(plan lines, problems) for `shape`."""
+    if conn.dialect.name == 'sqlite':
+        rows = conn.execute(text(f'EXPLAIN QUERY PLAN {shape.sql}'), params).all()
+        lines = [row[-1] for row in rows]
+        problems = []
+        for detail in lines:
+            # "SCAN t" is a table scan; "SCAN t USING INDEX ..." walks an index in order
+            if detail.startswith('SCAN ') and ' USING ' not in detail:
+                problems.append(f'full table scan ({detail})')
+            if 'TEMP B-TREE' in detail:
+                problems.append(f'sort ({detail})')
+        return lines, problems
+
+    options = 'ANALYZE, BUFFERS, FORMAT JSON' if analyze else 'FORMAT JSON'
+    plan = conn.execute(text(f'EXPLAIN ({options}) {shape.sql}'), params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    lines, problems = [], []
+
+    def walk(node, depth):
+        label = node['Node Type']
+        if node.get('Relation Name'):
+            label += f" on {node['Relation Name']}"
+        if node.get('Index Name'):
+            label += f" using {node['Index Name']}"
+        cost = f"cost={node.get('Total Cost')} rows={node.get('Plan Rows')}"
+        if 'Actual Total Time' in node:
+            cost += f" actual={node['Actual Total Time']}ms rows={node['Actual Rows']}"
+        lines.append(f"{'  ' * depth}{label} ({cost})")
+        if node['Node Type'] == 'Seq Scan':
+            problems.append(f"full table scan of {node['Relation Name']}")
+        if node['Node Type'] == 'Sort':
+            problems.append(f"sort on {', '.join(node.get('Sort Key', []))}")
+        for child in node.get('Plans', []):
+            walk(child, depth + 1)
+
+    walk(plan[0]['Plan'], 0)
+    return lines, problems
+
+
+def serving_index(indexes: list[tuple[str, list]], columns: tuple):
+    """Name of an existing index whose leading columns are `columns`, if any."""
+    for name, index_columns in indexes:
+        if tuple(index_columns[:len(columns)]) == columns:
+            return name
+    return None
+
+
+def table_indexes(inspector, table: str) -> list[tuple[str, list]]:
+    indexes = [(index['name'], index['column_names']) for index in inspector.get_indexes(table)]
+    pk = inspector.get_pk_constraint(table).get('constrained_columns') or []
+    if pk:
+        indexes.append(('PRIMARY KEY', pk))
+    return indexes
+
+
+def format_bytes(size) -> str:
+    if size is None:
+        return '-'
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if size < 1024 or unit == 'GiB':
+            return f'{size:.0f} {unit}' if unit == 'B' else f'{size:.1f} {unit}'
+        size /= 1024
+
+
+def report_sizes(conn, tables: list[str]):
+    print('Tables')
+    if conn.dialect.name == 'sqlite':
+        try:
+            sizes = dict(conn.execute(text('SELECT name, SUM(pgsize) FROM dbstat GROUP BY name')).all())
+        except Exception:
+            # SQLite built without the dbstat virtual table: sizes unknown
+            conn.rollback()
+            sizes = {}
+        index_owner = dict(conn.execute(text("SELECT name, tbl_name FROM sqlite_master WHERE type = 'index'")).all())
+        print(f"  {'table':<20}{'rows':>12}{'table size':>14}{'index size':>14}")
+        for table in tables:
+            rows = conn.execute(text(f'SELECT COUNT(*) FROM "{table}"')).scalar()
+            index_size = sum(sizes.get(index, 0) for index, owner in index_owner.items() if owner == table) if sizes else None
+            print(f'  {table:<20}{rows:>12}{format_bytes(sizes.get(table)):>14}{format_bytes(index_size):>14}')
+        if sizes:
+            print('Indexes')
+            for index, owner in sorted(index_owner.items(), key=lambda item: (item[1], item[0])):
+                print(f'  {owner + "." + index:<60}{format_bytes(sizes.get(index)):>14}')
+        return
+
+    rows = conn.execute(text(
+        'SELECT relname, n_live_tup, n_dead_tup, pg_relation_size(relid), pg_indexes_size(relid), '
+        'COALESCE(last_autovacuum, last_vacuum), COALESCE(last_autoanalyze, last_analyze) '
+        'FROM pg_stat_user_tables ORDER BY relname'
+    )).all()
+    print(f"  {'table':<20}{'~rows':>12}{'dead rows':>12}{'table size':>14}{'index size':>14}  last vacuum / analyze")
+    for name, live, dead, table_size, index_size, vacuumed, analyzed in rows:
+        print(f'  {name:<20}{live:>12}{dead:>12}{format_bytes(table_size):>14}{format_bytes(index_size):>14}  {vacuumed} / {analyzed}')
+    print('Indexes (scans since statistics reset)')
+    for table, index, size, scans in conn.execute(text(
+        'SELECT relname, indexrelname, pg_relation_size(indexrelid), idx_scan FROM pg_stat_user_indexes ORDER BY relname, indexrelname'
+    )).all():
+        note = '  <- never used' if scans == 0 else ''
+        print(f'  {table + "." + index:<60}{format_bytes(size):>14}{scans:>10}{note}')
+
+
+def report_fragmentation(conn):
+    if conn.dialect.name == 'sqlite':
+        page_size = conn.execute(text('PRAGMA page_size')).scalar()
+        page_count = conn.execute(text('PRAGMA page_count')).scalar()
+        free_pages = conn.execute(text('PRAGMA freelist_count')).scalar()
+        free_ratio = free_pages / page_count if page_count else 0
+        print('Fragmentation')
+        print(f'  file {format_bytes(page_size * page_count)}, {free_pages} free pages ({free_ratio:.0%} reclaimable by VACUUM)')
+        try:
+            unused, total = conn.execute(text('SELECT SUM(unused), SUM(pgsize) FROM dbstat')).one()
+            if total:
+                print(f'  {unused / total:.0%} of used pages is empty space')
+        except Exception:
+            conn.rollback()
+        if free_ratio > 0.1:
+            print('  -> consider --vacuum')
+        return
+    bloated = conn.execute(text(
+        'SELECT relname, n_dead_tup, n_live_tup FROM pg_stat_user_tables '
+        'WHERE n_dead_tup > 1000 AND n_dead_tup > 0.2 * n_live_tup ORDER BY n_dead_tup DESC'
+    )).all()
+    print('Fragmentation')
+    if not bloated:
+        print('  no table has more than 20% dead rows')
+    for name, dead, live in bloated:
+        print(f'  {name}: {dead} dead rows vs {live} live -> consider --vacuum (or check autovacuum)')
+
+
+def report_plans(conn, inspector, tables: list[str], verbose: bool, analyze: bool) -> list[str]:
+    params = sample_params(conn)
+    suggestions = []
+    print('Query plans')
+    for shape in QUERY_SHAPES:
+        if shape.table not in tables:
+            print(f'  {shape.name}: table {shape.table} missing')
+            continue
+        lines, problems = explain(conn, shape, params, analyze)
+        index = serving_index(table_indexes(inspector, shape.table), shape.index)
+        status = 'OK' if not problems else 'CHECK'
+        print(f"  [{status:>5}] {shape.name}" + (f'  (index {index})' if index else ''))
+        if verbose or problems:
+            for line in lines:
+                print(f'          {line}')
+        for problem in problems:
+            print(f'          ! {problem}')
+        if index is None:
+            name = f"ix_{shape.table}_{'_'.join(shape.index)}"
+            suggestion = f'CREATE INDEX {name} ON "{shape.table}" ({", ".join(shape.index)});'
+            if suggestion not in suggestions:
+                suggestions.append(suggestion)
+            print(f'          -> no index on ({", ".join(shape.index)})')
+        elif problems and any(index in line for line in lines):
+            print(f'          -> {index} is used; the rest only touches the rows it selects')
+        elif problems:
+            print(f'          -> {index} exists but was not used: table may be small, or run --analyze')
+    return suggestions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default=DATABASE_URL, help='Database URL (default: DATABASE_URL)')
+    parser.add_argument('--plans-only', action='store_true', help='Skip sizes and fragmentation')
+    parser.add_argument('--verbose', action='store_true', help='Print every plan, not only problematic ones')
+    parser.add_argument('--explain-analyze', action='store_true', help='PostgreSQL: run the queries (EXPLAIN ANALYZE, BUFFERS)')
+    parser.add_argument('--analyze', action='store_true', help='Run ANALYZE before inspecting')
+    parser.add_argument('--vacuum', action='store_true', help='Run VACUUM after inspecting')
+    args = parser.parse_args()
+
+    engine = make_engine(args.url)
+    inspector = inspect(engine)
+    tables = sorted(inspector.get_table_names())
+    print(f'{engine.url.render_as_string(hide_password=True)} ({engine.dialect.name}), {len(tables)} tables\n')
+
+    if args.analyze:
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            conn.execute(text('ANALYZE'))
+        print('ANALYZE done\n')
+
+    with engine.connect() as conn:
+        if not args.plans_only:
+            report_sizes(conn, tables)
+            print()
+            report_fragmentation(conn)
+            print()
+        suggestions = report_plans(conn, inspector, tables, args.verbose, args.explain_analyze)
+        conn.rollback()
+
+    print()
+    if suggestions:
+        print('Suggested indexes (declare them on the model and add a migration in migrations.py):')
+        for suggestion in suggestions:
+            print(f'  {suggestion}')
+    else:
+        print('Every query shape has a matching index.')
+
+    if args.vacuum:
+        # VACUUM cannot run inside a transaction
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            conn.execute(text('VACUUM'))
+        print('\nVACUUM done')
+
+
+if __name__ == '__main__':
+    main()
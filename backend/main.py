@@ -1,19 +1,43 @@
+import time
+
+# startup time is reported from here, so it includes importing everything below
+IMPORT_STARTED = time.perf_counter()
+
 from datetime import datetime
-from typing import Optional, List
+from typing import Literal, Optional, List
+import asyncio
+import csv
+import hashlib
+import io
+import json
+import logging
 import os
 
-from fastapi import FastAPI, HTTPException, Depends, Header
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-import hashlib
-import binascii
-import uuid
-from sqlmodel import SQLModel, Field, create_engine, Session, select
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import Index, insert, tuple_, update
+from sqlmodel import SQLModel, Field, Session, select
+
+from audit import AuditWriter
+from cache_versions import ResponseCache, create_version_store
+from database import DATABASE_READ_URL, DATABASE_URL, DB_ASYNC, Database, is_sqlite, make_async_engine, make_engine, open_database
+from hashing import DUMMY_HASH, HashingBusy, hashing_executor
+from metrics import GaugeFunc, MetricsMiddleware, instrument_engine, registry
+from migrations import ensure_schema
+from notifications import HEARTBEAT, NotificationBuffer, NotificationStore, create_broker
+from rate_limit import RateLimited, create_rate_limiter
+from responses import CompressionMiddleware, FastJSONResponse, dumps, ndjson
+from secret_crypto import DataKeyCache, MasterKeyMissing, SecretBox, SecretUnavailable, create_key_provider, sealed_prefix, zeroize
+from session_store import create_session_store
+from user_cache import UserCache
+from workflow_stats import create_workflow_stats, created_deltas, summarize, transition_deltas
+
+logger = logging.getLogger(__name__)
 
 # Development-mode backend (no JWT) with workflow, notifications (polling) and audit
 
-SALT_BYTES = 16
-PBKDF2_ITERATIONS = 200_000
-
 app = FastAPI(title="Key Harmony Sync API - DEV MODE")
 
 # CORS for local dev
@@ -25,7 +49,19 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
+# gzip / brotli for JSON, NDJSON and CSV bodies from COMPRESSION_MIN_SIZE bytes (0 disables)
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+if COMPRESSION_MIN_SIZE > 0:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=COMPRESSION_MIN_SIZE,
+        gzip_level=int(os.getenv("GZIP_LEVEL", "5")),
+        brotli_quality=int(os.getenv("BROTLI_QUALITY", "4")),
+    )
+# per-route latency, status, in-flight and DB query counts, exported at /api/metrics
+app.add_middleware(MetricsMiddleware)
 
 
 # --- Database models ---
@@ -37,6 +73,13 @@ class User(SQLModel, table=True):
 
 
 class Secret(SQLModel, table=True):
+    # newest-first listing, per owner or overall, optionally filtered by name (see list_secrets)
+    __table_args__ = (
+        Index("ix_secret_created_at", "created_at"),
+        Index("ix_secret_owner_id_created_at", "owner_id", "created_at"),
+        Index("ix_secret_name", "name"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     owner_id: int
     name: str
@@ -45,6 +88,13 @@ class Secret(SQLModel, table=True):
 
 
 class SecretRequest(SQLModel, table=True):
+    # composite indexes back the per-user and per-status listings in list_requests, the plain one the admin view
+    __table_args__ = (
+        Index("ix_secretrequest_created_at", "created_at"),
+        Index("ix_secretrequest_requester_id_created_at", "requester_id", "created_at"),
+        Index("ix_secretrequest_status_created_at", "status", "created_at"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     requester_id: int
     secret_name: str
@@ -58,9 +108,16 @@ class SecretRequest(SQLModel, table=True):
 
 
 class AuditLog(SQLModel, table=True):
+    # newest-first listing, optionally filtered by user or action (see get_audit)
+    __table_args__ = (
+        Index("ix_auditlog_created_at", "created_at"),
+        Index("ix_auditlog_user_id_created_at", "user_id", "created_at"),
+        Index("ix_auditlog_action_created_at", "action", "created_at"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: Optional[int] = None
-    action: str = Field(index=True)
+    action: str
     details: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
@@ -81,6 +138,20 @@ class RequestCreate(SQLModel):
     reason: Optional[str] = None
 
 
+class NotificationsRead(SQLModel):
+    last_id: int
+
+
+class BulkOperation(SQLModel):
+    request_id: int
+    action: Literal["review", "awaiting_admin", "approve", "deny"]
+    payload: Optional[dict] = None
+
+
+class BulkOperations(SQLModel):
+    operations: List[BulkOperation]
+
+
 class RequestOut(SQLModel):
     id: int
     requester_id: int
@@ -94,40 +165,39 @@ class RequestOut(SQLModel):
     secret_id: Optional[int]
 
 
-# Database setup (support DATABASE_URL env for Postgres; fallback to sqlite file)
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./db.sqlite")
-if DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-else:
-    engine = create_engine(DATABASE_URL)
+class SecretOut(SQLModel):
+    id: int
+    name: str
+    owner_id: int
+    owner_username: Optional[str] = None
+    created_at: datetime
 
 
-def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
+# Database setup (support DATABASE_URL env for Postgres; fallback to sqlite file).
+# read_engine is a separate read-only pool (or DATABASE_READ_URL replica) for list endpoints.
+engine = make_engine(DATABASE_URL)
+read_engine = make_engine(DATABASE_READ_URL, read_only=True)
+# DB_ASYNC=true: request handlers go through async engines; background workers and scripts keep the sync ones
+async_engine = make_async_engine(DATABASE_URL) if DB_ASYNC else None
+async_read_engine = make_async_engine(DATABASE_READ_URL, read_only=True) if DB_ASYNC else None
+for e in (engine, read_engine, async_engine, async_read_engine):
+    if e is not None:
+        instrument_engine(getattr(e, "sync_engine", e))
 
 
-def get_session():
-    with Session(engine) as session:
-        yield session
+async def get_db():
+    """Request-scoped database handle; `await db.run(fn, *args)` calls `fn(session, *args)`."""
+    async with open_database(engine, async_engine) as db:
+        yield db
 
 
-def get_password_hash(password: str) -> str:
-    salt = os.urandom(SALT_BYTES)
-    dk = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, PBKDF2_ITERATIONS)
-    return f"pbkdf2_sha256${PBKDF2_ITERATIONS}${binascii.hexlify(salt).decode()}${binascii.hexlify(dk).decode()}"
+async def get_read_db():
+    async with open_database(read_engine, async_read_engine) as db:
+        yield db
 
 
-def verify_password(plain_password: str, stored_hash: str) -> bool:
-    try:
-        scheme, iter_str, salt_hex, hash_hex = stored_hash.split("$", 3)
-        if scheme != "pbkdf2_sha256":
-            return False
-        iterations = int(iter_str)
-        salt = binascii.unhexlify(salt_hex)
-        dk = hashlib.pbkdf2_hmac("sha256", plain_password.encode("utf-8"), salt, iterations)
-        return binascii.hexlify(dk).decode() == hash_hex
-    except Exception:
-        return False
+def fetch_all(session: Session, statement) -> list:
+    return session.exec(statement).all()
 
 
 def get_user_by_username(session: Session, username: str) -> Optional[User]:
@@ -135,244 +205,1032 @@ def get_user_by_username(session: Session, username: str) -> Optional[User]:
     return session.exec(statement).first()
 
 
-# Simple in-memory notifications cache (per user id)
-notifications_cache: dict[int, list[str]] = {}
+def request_out(req: SecretRequest, requester_username: Optional[str]) -> dict:
+    """Serialize a SecretRequest for RequestOut, enriched with the requester's username."""
+    return {
+        "id": req.id,
+        "requester_id": req.requester_id,
+        "requester_username": requester_username,
+        "secret_name": req.secret_name,
+        "reason": req.reason,
+        "status": req.status,
+        "created_at": req.created_at,
+        "resolved_at": req.resolved_at,
+        "admin_comment": req.admin_comment,
+        "secret_id": req.secret_id,
+    }
+
+
+def request_changed(session: Session, requester_id: int):
+    """Invalidate cached listings once `session` commits a change to a request of `requester_id`.
+
+    Every workflow change writes an audit entry in the same transaction, so the audit view goes too.
+    """
+    cache_versions.bump(session, "requests", f"requests:{requester_id}", "audit")
+
+
+CACHE_HEADERS = {"Cache-Control": "private, no-cache"}
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    return bool(header) and (header.strip() == "*" or etag in (t.strip() for t in header.split(",")))
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, **CACHE_HEADERS})
+
+
+async def replica_view_etag(*keys: str, extra: str) -> Optional[str]:
+    """ETag of a view read through get_read_db, or None if the counters cannot vouch for the
+    replica (REPLICA_ETAGS): then the view is served without ETag or response cache."""
+    if not REPLICA_ETAGS:
+        return None
+    return await run_in_threadpool(cache_versions.etag, *keys, extra=extra)
+
+
+def list_response(content, next_cursor: Optional[str], etag: Optional[str] = None) -> Response:
+    """A list page as JSON, bypassing the route's response_model: the handlers build the rows
+    themselves, so re-validating them would only cost CPU. `content` may be an already encoded body."""
+    headers = {"ETag": etag, **CACHE_HEADERS} if etag else {}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    if isinstance(content, bytes):
+        return Response(content, media_type="application/json", headers=headers)
+    return FastJSONResponse(content, headers=headers)
+
+
+# Notifications: durable table + bounded per-user ring buffers (NOTIFICATION_BUFFER_SIZE newest per user,
+# NOTIFICATION_BUFFER_USERS users). Push delivery for /api/notifications/stream goes through the broker:
+# "memory" (single process) or "postgres" (LISTEN/NOTIFY, multi-worker; also keeps every worker's buffers current)
+NOTIFICATION_BROKER = os.getenv("NOTIFICATION_BROKER", "memory")
+# memory broker only: buffers re-check the table for other workers' notifications this often (seconds);
+# polls are at most this stale. SSE streams still only carry this worker's events: use "postgres" for those.
+NOTIFICATION_REFRESH_INTERVAL = float(os.getenv("NOTIFICATION_REFRESH_INTERVAL", "2"))
+notifications_buffer = NotificationBuffer(
+    size=int(os.getenv("NOTIFICATION_BUFFER_SIZE", "100")),
+    max_users=int(os.getenv("NOTIFICATION_BUFFER_USERS", "10000")),
+)
+broker = create_broker(
+    NOTIFICATION_BROKER,
+    notifications_buffer,
+    None if is_sqlite(DATABASE_URL) else engine.url.set(drivername="postgresql").render_as_string(hide_password=False),
+)
+notification_store = NotificationStore(
+    engine, broker, refresh_interval=NOTIFICATION_REFRESH_INTERVAL if NOTIFICATION_BROKER == "memory" else 0,
+)
+
+
+def notify(session: Session, user_id: int, message: str):
+    """Record a notification in the caller's transaction; it is pushed once that commits."""
+    notification_store.add(session, user_id, message)
+
+
+# Session tokens for dev auth: token -> user_id. SESSION_STORE=memory (single process) or
+# database (shared by all workers, locally cached for SESSION_CACHE_TTL seconds)
+sessions = create_session_store(
+    os.getenv("SESSION_STORE", "memory"),
+    engine,
+    ttl=float(os.getenv("SESSION_TTL", str(12 * 3600))),
+    max_entries=int(os.getenv("SESSION_MAX_ENTRIES", "100000")),
+    cache_ttl=float(os.getenv("SESSION_CACHE_TTL", "30")),
+)
+# Change counters behind the ETags of /api/requests and /api/audit (CACHE_VERSION_STORE=memory, or
+# database to share them between workers), and a short-lived cache of the admin-wide pages keyed by ETag.
+# The memory store only counts this process's writes: with several workers it answers 304 for data
+# changed through another worker until this one changes it too.
+CACHE_VERSION_STORE = os.getenv("CACHE_VERSION_STORE", "memory")
+cache_versions = create_version_store(
+    CACHE_VERSION_STORE,
+    engine,
+    cache_ttl=float(os.getenv("CACHE_VERSION_TTL", "1")),
+    read_engine=read_engine,
+)
+# Those views read their rows from DATABASE_READ_URL. The database store reads its counters there
+# too, so they lag exactly like the rows; per-process counters would run ahead of a lagging
+# replica and pair a new tag with stale rows, so with a separate replica they are not used.
+REPLICA_ETAGS = CACHE_VERSION_STORE != "memory" or DATABASE_READ_URL == DATABASE_URL
+# Request counts, daily throughput and time-to-resolution for /api/stats, updated with every status
+# change (WORKFLOW_STATS_STORE=memory, rebuilt on startup, or database to share them between workers)
+workflow_stats = create_workflow_stats(os.getenv("WORKFLOW_STATS_STORE", "memory"), engine)
+admin_view_cache = ResponseCache(
+    ttl=float(os.getenv("ADMIN_VIEW_CACHE_TTL", "5")),
+    max_entries=int(os.getenv("ADMIN_VIEW_CACHE_ENTRIES", "256")),
+)
+
+# Audit entries that need not commit with a state change are bulk-inserted in the background
+audit_writer = AuditWriter(
+    engine,
+    AuditLog,
+    batch_size=int(os.getenv("AUDIT_BATCH_SIZE", "500")),
+    flush_interval=float(os.getenv("AUDIT_FLUSH_INTERVAL", "0.5")),
+    max_queue=int(os.getenv("AUDIT_MAX_QUEUE", "10000")),
+    max_attempts=int(os.getenv("AUDIT_WRITE_ATTEMPTS", "5")),
+    on_write=lambda: cache_versions.bump_now("audit"),
+)
+
+# Authenticated users by id, so get_current_user skips the DB on hot polling endpoints
+user_cache = UserCache(
+    ttl=float(os.getenv("USER_CACHE_TTL", "60")),
+    max_entries=int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000")),
+)
+
+# Secret values are envelope-encrypted at rest (see secret_crypto.py). SECRET_KEY_PROVIDER=local
+# (master key in SECRET_MASTER_KEY_FILE) or openbao; unwrapped data keys are cached per process.
+secret_box = SecretBox(
+    create_key_provider(os.getenv("SECRET_KEY_PROVIDER", "local")),
+    DataKeyCache(
+        max_entries=int(os.getenv("SECRET_KEY_CACHE_SIZE", "1000")),
+        ttl=float(os.getenv("SECRET_KEY_CACHE_TTL", "300")),
+    ),
+)
+
+
+def secret_aad(secret: Secret) -> str:
+    # binds the ciphertext to its owner and name
+    return f"{secret.owner_id}:{secret.name}"
 
-# In-memory session tokens for dev auth: token -> user_id
-sessions: dict[str, int] = {}
+
+def check_master_key():
+    """Refuse to start without the local master key file rather than fail on first use."""
+    provider = secret_box.provider
+    if not hasattr(provider, "exists") or provider.exists():
+        return
+    with Session(engine) as session:
+        sealed = session.exec(select(Secret.id).where(Secret.value.startswith(sealed_prefix(provider))).limit(1)).first()
+    if sealed is not None:
+        raise MasterKeyMissing(
+            f"Master key file {provider.path} not found, but secrets sealed with a local master key exist: "
+            "restore the file or point SECRET_MASTER_KEY_FILE at it (a new key could not decrypt them)"
+        )
+    raise MasterKeyMissing(f"Master key file {provider.path} not found: run python bootstrap.py to create it")
+
+
+# Login throttling, checked before any user lookup or hashing: a token bucket per client IP and
+# per username, and exponential backoff (LOGIN_BACKOFF_BASE * 2^n seconds, up to LOGIN_BACKOFF_MAX)
+# once a username has LOGIN_BACKOFF_AFTER consecutive failures (not per IP, which may be a shared NAT). LOGIN_RATE_LIMITER=memory (per process)
+# or database (shared by all workers).
+LOGIN_IP_BURST = float(os.getenv("LOGIN_IP_BURST", "20"))
+LOGIN_IP_PER_MINUTE = float(os.getenv("LOGIN_IP_PER_MINUTE", "60"))
+LOGIN_USER_BURST = float(os.getenv("LOGIN_USER_BURST", "5"))
+LOGIN_USER_PER_MINUTE = float(os.getenv("LOGIN_USER_PER_MINUTE", "5"))
+login_limiter = create_rate_limiter(
+    os.getenv("LOGIN_RATE_LIMITER", "memory"),
+    engine,
+    backoff_after=int(os.getenv("LOGIN_BACKOFF_AFTER", "3")),
+    backoff_base=float(os.getenv("LOGIN_BACKOFF_BASE", "1")),
+    backoff_max=float(os.getenv("LOGIN_BACKOFF_MAX", "300")),
+)
+
+# In-process state sampled at scrape time by /api/metrics
+for name, help, fn, kind in (
+    ("password_hashes_total", "Password hash/verify calls completed.", lambda: hashing_executor.stats()["completed"], "counter"),
+    ("password_hash_seconds_total", "Time spent in password hash/verify calls.", lambda: hashing_executor.stats()["total_seconds"], "counter"),
+    ("password_hash_p99_seconds", "p99 password hashing call latency over the recent window.", lambda: hashing_executor.stats()["p99_seconds"], "gauge"),
+    ("password_hash_pending", "Password hashing calls queued or running.", lambda: hashing_executor.stats()["pending"], "gauge"),
+    ("password_hash_rejected_total", "Password hashing calls rejected with 503 (queue full).", lambda: hashing_executor.stats()["rejected"], "counter"),
+    ("sessions_cached", "Session tokens held in this process.", lambda: len(sessions), "gauge"),
+    ("notification_buffer_users", "Users with a notification buffer in this process.", lambda: len(notifications_buffer), "gauge"),
+    ("notification_publish_errors_total", "Committed notifications the broker failed to publish.", lambda: notification_store.publish_errors, "counter"),
+    ("notification_broker_errors_total", "Notifications the broker could not send to other workers.", lambda: getattr(broker, "publish_errors", 0), "counter"),
+    ("user_cache_entries", "Users in the authenticated-user cache.", lambda: len(user_cache), "gauge"),
+    ("user_cache_hits_total", "Authenticated-user cache hits.", lambda: user_cache.hits, "counter"),
+    ("user_cache_misses_total", "Authenticated-user cache misses.", lambda: user_cache.misses, "counter"),
+    ("login_rate_limited_total", "Login attempts rejected by the rate limiter.", lambda: login_limiter.rejected, "counter"),
+    ("secret_key_cache_entries", "Unwrapped secret data keys cached.", lambda: len(secret_box.cache), "gauge"),
+    ("secret_key_cache_hits_total", "Secret data key cache hits.", lambda: secret_box.cache.hits, "counter"),
+    ("secret_key_cache_misses_total", "Secret data key cache misses (key provider unwraps).", lambda: secret_box.cache.misses, "counter"),
+    ("admin_view_cache_hits_total", "Admin list pages served from the response cache.", lambda: admin_view_cache.hits, "counter"),
+    ("admin_view_cache_misses_total", "Admin list pages computed (response cache misses).", lambda: admin_view_cache.misses, "counter"),
+    ("audit_queue_pending", "Audit entries waiting for the background writer.", lambda: audit_writer.pending(), "gauge"),
+    ("audit_queue_overflows_total", "Audit entries dropped because the writer queue was full.", lambda: audit_writer.overflows, "counter"),
+    ("audit_write_retries_total", "Audit batch writes retried after a failure.", lambda: audit_writer.retries, "counter"),
+    ("audit_dropped_total", "Audit entries dropped after every write attempt failed.", lambda: audit_writer.dropped, "counter"),
+    ("startup_seconds", "Time from importing the app to the end of startup.", lambda: startup_timings.get("total_seconds"), "gauge"),
+):
+    registry.register(GaugeFunc(name, help, fn, kind))
+
+
+# Workers only check the schema version (one query); DB_AUTO_MIGRATE=false makes an outdated
+# schema a startup error instead of migrating it here. Run bootstrap.py to migrate and create the admin.
+DB_AUTO_MIGRATE = os.getenv("DB_AUTO_MIGRATE", "true").lower() in ("1", "true", "yes")
+startup_timings: dict[str, float] = {}
 
 
 @app.on_event("startup")
 def on_startup():
-    create_db_and_tables()
-    # Ensure default admin exists
-    with Session(engine) as session:
-        admin = get_user_by_username(session, "admin")
-        if not admin:
-            admin_user = User(username="admin", hashed_password=get_password_hash("password"), is_admin=True)
-            session.add(admin_user)
-            session.commit()
+    started = time.perf_counter()
+    startup_timings["import_seconds"] = started - IMPORT_STARTED
+    ensure_schema(engine, SQLModel.metadata, auto_migrate=DB_AUTO_MIGRATE)
+    schema_checked = time.perf_counter()
+    startup_timings["schema_seconds"] = schema_checked - started
+    check_master_key()
+    workflow_stats.load(engine, SecretRequest)
+    startup_timings["workflow_stats_seconds"] = time.perf_counter() - schema_checked
+    startup_timings["total_seconds"] = time.perf_counter() - IMPORT_STARTED
+    logger.info(
+        "Started in %.0f ms (imports %.0f ms, schema check %.0f ms, workflow stats %.0f ms)",
+        *(startup_timings[key] * 1000 for key in ("total_seconds", "import_seconds", "schema_seconds", "workflow_stats_seconds")),
+    )
+
+
+@app.on_event("startup")
+async def start_background_workers():
+    broker.start(asyncio.get_running_loop())
+    audit_writer.start()
+
+
+@app.on_event("shutdown")
+def on_shutdown():
+    audit_writer.stop()
+    hashing_executor.shutdown()
+    broker.stop()
+    secret_box.cache.clear()
+
+
+@app.on_event("shutdown")
+async def dispose_async_engines():
+    for e in (async_engine, async_read_engine):
+        if e is not None:
+            await e.dispose()
+
+
+@app.exception_handler(HashingBusy)
+def hashing_busy_handler(request: Request, exc: HashingBusy):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server busy, try again later"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+@app.exception_handler(SecretUnavailable)
+def secret_unavailable_handler(request: Request, exc: SecretUnavailable):
+    logger.error("Cannot decrypt secret for %s: %s", request.url.path, exc)
+    return JSONResponse(status_code=500, content={"detail": "Secret cannot be decrypted with the configured master key"})
+
+
+@app.exception_handler(RateLimited)
+def rate_limited_handler(request: Request, exc: RateLimited):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": "Too many login attempts, try again later"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+def check_login_allowed(ip: str, username: str):
+    login_limiter.hit(f"ip:{ip}", LOGIN_IP_BURST, LOGIN_IP_PER_MINUTE / 60)
+    login_limiter.hit(f"user:{username}", LOGIN_USER_BURST, LOGIN_USER_PER_MINUTE / 60)
 
 
 @app.post("/api/login")
-def login_for_access_token(form_data: LoginRequest, session: Session = Depends(get_session)):
-    user = get_user_by_username(session, form_data.username)
-    if not user:
+async def login_for_access_token(form_data: LoginRequest, request: Request, db: Database = Depends(get_db)):
+    ip = request.client.host if request.client else "unknown"
+    await run_in_threadpool(check_login_allowed, ip, form_data.username)
+    user = await db.run(get_user_by_username, form_data.username)
+    # unknown users still pay for a verification, so timing does not reveal which usernames exist
+    ok, new_hash = await hashing_executor.verify_and_update(form_data.password, user.hashed_password if user else DUMMY_HASH)
+    if not user or not ok:
+        await run_in_threadpool(login_limiter.failure, f"user:{form_data.username}")
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    if not verify_password(form_data.password, user.hashed_password):
-        raise HTTPException(status_code=401, detail="Invalid credentials")
-    # DEV MODE: create a random in-memory token
-    token = str(uuid.uuid4())
-    sessions[token] = user.id
-    return {"access_token": token, "token_type": "bearer", "id": user.id, "username": user.username, "is_admin": user.is_admin}
+    await run_in_threadpool(login_limiter.success, f"user:{form_data.username}")
+    # read before the rehash commit expires `user` (reloading it lazily fails with DB_ASYNC)
+    user_id, username, is_admin = user.id, user.username, user.is_admin
+    if new_hash:
+        # stored with an older scheme or parameters: upgrade while we have the plaintext
+        await db.run(update_password_hash, user_id, new_hash)
+    # DEV MODE: random opaque token, expires after SESSION_TTL
+    token = await run_in_threadpool(sessions.create, user_id)
+    return {"access_token": token, "token_type": "bearer", "id": user_id, "username": username, "is_admin": is_admin}
+
+
+def update_password_hash(session: Session, user_id: int, hashed_password: str):
+    session.exec(update(User).where(User.id == user_id).values(hashed_password=hashed_password))
+    session.commit()
+    # logins read the hash from the DB and cached users are only used for authorization, so
+    # other workers' caches stay valid: no broadcast (it would flush every worker's whole cache)
+    user_cache.invalidate(user_id, broadcast=False)
 
 
-def get_current_user(authorization: str = Header(None), session: Session = Depends(get_session)) -> User:
-    """Resolve Bearer token from Authorization header to a DB User object (dev authenticator)."""
+def get_bearer_token(authorization: str = Header(None)) -> str:
     if not authorization:
         raise HTTPException(status_code=401, detail="Missing Authorization header")
     if not authorization.lower().startswith("bearer "):
         raise HTTPException(status_code=401, detail="Invalid authorization scheme")
-    token = authorization.split(" ", 1)[1]
-    user_id = sessions.get(token)
+    return authorization.split(" ", 1)[1]
+
+
+def load_user(session: Session, user_id: int) -> Optional[User]:
+    user = session.get(User, user_id)
+    if user:
+        user_cache.put(user_id, user.model_dump())
+    return user
+
+
+async def get_current_user(authorization: str = Header(None), db: Database = Depends(get_db)) -> User:
+    """Resolve Bearer token from Authorization header to a DB User object (dev authenticator)."""
+    token = get_bearer_token(authorization)
+    user_id = sessions.cached(token)
+    if user_id is None:
+        user_id = await run_in_threadpool(sessions.get, token)
     if not user_id:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
-    user = session.get(User, user_id)
+    cached = user_cache.get(user_id)
+    if cached is not None:
+        return User(**cached)
+    user = await db.run(load_user, user_id)
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
     return user
 
 
+@app.post("/api/logout")
+async def logout(token: str = Depends(get_bearer_token)):
+    await run_in_threadpool(sessions.revoke, token)
+    return {"ok": True}
+
+
 @app.get("/api/health")
-def health():
+async def health():
     return {"status": "ok"}
 
 
+@app.get("/api/metrics")
+async def metrics():
+    """Prometheus text exposition of request, DB, hashing and cache metrics for this process."""
+    return Response(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/api/cache/stats")
+async def cache_stats(current_user: User = Depends(get_current_user)):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin privileges required")
+    return {
+        "users": user_cache.stats(),
+        "secret_keys": secret_box.cache.stats(),
+        "admin_views": {"size": len(admin_view_cache), "hits": admin_view_cache.hits, "misses": admin_view_cache.misses},
+    }
+
+
 @app.post("/api/register")
-def register_user(payload: LoginRequest, session: Session = Depends(get_session)):
+async def register_user(payload: LoginRequest, db: Database = Depends(get_db)):
     """Development helper: create a user (username/password). Not protected.
     Use only in local development. Creates or updates user in the database.
     """
-    existing = get_user_by_username(session, payload.username)
+    hashed_password = await hashing_executor.hash(payload.password)
+    return await db.run(save_user, payload.username, hashed_password)
+
+
+def save_user(session: Session, username: str, hashed_password: str) -> dict:
+    existing = get_user_by_username(session, username)
     if existing:
-        existing.hashed_password = get_password_hash(payload.password)
+        existing.hashed_password = hashed_password
         session.add(existing)
         session.commit()
+        user_cache.invalidate(existing.id)
         return {"ok": True, "updated": True}
-    user = User(username=payload.username, hashed_password=get_password_hash(payload.password), is_admin=False)
+    user = User(username=username, hashed_password=hashed_password, is_admin=False)
     session.add(user)
     session.commit()
     return {"ok": True, "created": True}
 
 
 @app.post("/api/requests", response_model=RequestOut)
-def create_request(payload: RequestCreate, session: Session = Depends(get_session), current_user: User = Depends(get_current_user)):
+async def create_request(payload: RequestCreate, db: Database = Depends(get_db), current_user: User = Depends(get_current_user)):
+    return await db.run(create_request_tx, payload, current_user)
+
+
+def create_request_tx(session: Session, payload: RequestCreate, current_user: User) -> dict:
     req = SecretRequest(requester_id=current_user.id, secret_name=payload.secret_name, reason=payload.reason, status="pending")
     session.add(req)
-    session.commit()
-    session.refresh(req)
     # Audit log
     session.add(AuditLog(user_id=current_user.id, action="create_request", details=f"secret: {payload.secret_name}"))
-    session.commit()
     # Notification
-    notifications_cache.setdefault(current_user.id, []).append(f"Заявка создана: {payload.secret_name}")
+    notify(session, current_user.id, f"Заявка создана: {payload.secret_name}")
+    request_changed(session, current_user.id)
+    workflow_stats.record(session, created_deltas(current_user.id, req.created_at))
+    session.commit()
+    session.refresh(req)
     # enrich response with username for frontend convenience
-    return {
-        "id": req.id,
-        "requester_id": req.requester_id,
-        "requester_username": current_user.username,
-        "secret_name": req.secret_name,
-        "reason": req.reason,
-        "status": req.status,
-        "created_at": req.created_at,
-        "resolved_at": req.resolved_at,
-        "admin_comment": req.admin_comment,
-        "secret_id": req.secret_id,
-    }
+    return request_out(req, current_user.username)
+
+
+# Listing page size: default when ?limit is omitted and hard upper bound
+REQUESTS_PAGE_SIZE = 100
+REQUESTS_MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    return f"{created_at.isoformat()}|{row_id}"
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        created_at, row_id = cursor.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def before_cursor(model, cursor: str):
+    """WHERE clause selecting rows after `cursor` in (created_at DESC, id DESC) order."""
+    cursor_created_at, cursor_id = decode_cursor(cursor)
+    # a row-value comparison is one range on the (..., created_at) index; the equivalent OR
+    # made SQLite merge two index lookups and sort the result (see inspect_db.py)
+    return tuple_(model.created_at, model.id) < tuple_(cursor_created_at, cursor_id)
 
 
 @app.get("/api/requests", response_model=List[RequestOut])
-def list_requests(all: bool = False, session: Session = Depends(get_session), current_user: User = Depends(get_current_user)):
+async def list_requests(
+    request: Request,
+    all: bool = False,
+    status: Optional[str] = None,
+    limit: int = Query(REQUESTS_PAGE_SIZE, ge=1, le=REQUESTS_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: Database = Depends(get_read_db),
+    current_user: User = Depends(get_current_user),
+):
+    """List requests newest first, one page at a time.
+
+    Pass the ``X-Next-Cursor`` response header back as ``?cursor=`` to fetch the next page;
+    the header is absent on the last page. Clients sending back the ETag get 304 while no
+    request in view has changed.
+    """
     if all and not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Admin privileges required")
-    if current_user.is_admin and all:
-        statement = select(SecretRequest)
-    else:
-        statement = select(SecretRequest).where(SecretRequest.requester_id == current_user.id)
-    results = session.exec(statement).all()
-    # enrich each request with requester_username
-    out = []
-    for r in results:
-        requester = session.get(User, r.requester_id)
-        out.append({
-            "id": r.id,
-            "requester_id": r.requester_id,
-            "requester_username": requester.username if requester else None,
-            "secret_name": r.secret_name,
-            "reason": r.reason,
-            "status": r.status,
-            "created_at": r.created_at,
-            "resolved_at": r.resolved_at,
-            "admin_comment": r.admin_comment,
-            "secret_id": r.secret_id,
-        })
-    return out
+    scope = "requests" if all else f"requests:{current_user.id}"
+    etag = await replica_view_etag(scope, extra=str(request.query_params))
+    if etag and etag_matches(request, etag):
+        return not_modified(etag)
+    page = admin_view_cache.get(etag) if all and etag else None
+    if page is None:
+        rows, next_cursor = await db.run(list_requests_page, current_user, all, status, limit, cursor)
+        if not (all and etag):
+            return list_response(rows, next_cursor, etag)
+        # cache the encoded body: hits skip serialization as well
+        page = (dumps(rows), next_cursor)
+        admin_view_cache.put(etag, page)
+    body, next_cursor = page
+    return list_response(body, next_cursor, etag)
+
+
+def list_requests_page(
+    session: Session, current_user: User, all: bool, status: Optional[str], limit: int, cursor: Optional[str],
+) -> tuple[list[dict], Optional[str]]:
+    # single joined query instead of one User lookup per row
+    statement = select(SecretRequest, User.username).join(User, User.id == SecretRequest.requester_id, isouter=True)
+    if not (current_user.is_admin and all):
+        statement = statement.where(SecretRequest.requester_id == current_user.id)
+    if status:
+        statement = statement.where(SecretRequest.status == status)
+    if cursor:
+        statement = statement.where(before_cursor(SecretRequest, cursor))
+    statement = statement.order_by(SecretRequest.created_at.desc(), SecretRequest.id.desc()).limit(limit + 1)
+    rows = session.exec(statement).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1][0]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    return [request_out(r, username) for r, username in rows], next_cursor
+
+
+# statuses from which an admin may still approve or deny
+OPEN_STATUSES = ["pending", "in_review", "awaiting_admin"]
+
+
+def try_transition(session: Session, req: SecretRequest, from_status: str, **values) -> bool:
+    """Move `req` to new column `values` only if its status is still `from_status`.
+
+    The check and the write are a single conditional UPDATE, so of several concurrent
+    callers exactly one wins. Returns whether this one did. `req` itself is not refreshed
+    (matching the UPDATE against every loaded object makes bulk transitions quadratic).
+    Checking the exact status (not just "still open") tells the workflow counters which
+    one to decrement.
+    """
+    result = session.exec(
+        update(SecretRequest)
+        .where(SecretRequest.id == req.id, SecretRequest.status == from_status)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        return False
+    request_changed(session, req.requester_id)
+    workflow_stats.record(session, transition_deltas(
+        req.requester_id, from_status, values["status"], req.created_at, values.get("resolved_at"),
+    ))
+    return True
+
+
+def transition_request(session: Session, req: SecretRequest, from_status: str, **values):
+    """try_transition that answers a lost race with 409 and rolls back the transaction."""
+    if not try_transition(session, req, from_status, **values):
+        session.rollback()
+        raise HTTPException(status_code=409, detail="Request was modified concurrently")
 
 
 @app.post("/api/requests/{request_id}/review")
-def review_request(request_id: int, session: Session = Depends(get_session), current_user: User = Depends(get_current_user)):
+async def review_request(request_id: int, db: Database = Depends(get_db), current_user: User = Depends(get_current_user)):
+    return await db.run(review_request_tx, request_id, current_user)
+
+
+def review_request_tx(session: Session, request_id: int, current_user: User) -> dict:
     req = session.get(SecretRequest, request_id)
     if not req:
         raise HTTPException(status_code=404, detail="Request not found")
     if req.status != "pending":
         raise HTTPException(status_code=400, detail="Request already processed")
-    req.status = "in_review"
-    session.add(req)
-    session.commit()
-    # Audit log
+    transition_request(session, req, "pending", status="in_review")
+    # Audit log, committed together with the status change
     session.add(AuditLog(user_id=current_user.id, action="review_request", details=f"request_id: {request_id}"))
+    notify(session, req.requester_id, f"Заявка {request_id} на рассмотрении")
     session.commit()
-    notifications_cache.setdefault(req.requester_id, []).append(f"Заявка {request_id} на рассмотрении")
     return {"ok": True}
 
 
 @app.post("/api/requests/{request_id}/awaiting_admin")
-def awaiting_admin_request(request_id: int, session: Session = Depends(get_session), current_user: User = Depends(get_current_user)):
+async def awaiting_admin_request(request_id: int, db: Database = Depends(get_db), current_user: User = Depends(get_current_user)):
+    return await db.run(awaiting_admin_request_tx, request_id, current_user)
+
+
+def awaiting_admin_request_tx(session: Session, request_id: int, current_user: User) -> dict:
     req = session.get(SecretRequest, request_id)
     if not req:
         raise HTTPException(status_code=404, detail="Request not found")
     if req.status != "in_review":
         raise HTTPException(status_code=400, detail="Request not in review")
-    req.status = "awaiting_admin"
-    session.add(req)
-    session.commit()
+    transition_request(session, req, "in_review", status="awaiting_admin")
     session.add(AuditLog(user_id=current_user.id, action="awaiting_admin", details=f"request_id: {request_id}"))
+    notify(session, req.requester_id, f"Заявка {request_id} ожидает действий администратора")
     session.commit()
-    notifications_cache.setdefault(req.requester_id, []).append(f"Заявка {request_id} ожидает действий администратора")
     return {"ok": True}
 
 
+def workflow_payload_error(action: str, payload: dict) -> Optional[str]:
+    """Why an approve / deny payload is invalid, or None. Payloads are free-form JSON, so a
+    number or object must be rejected here rather than fail while encrypting or storing it."""
+    if action == "approve":
+        secret_value = payload.get("secret_value")
+        if not secret_value:
+            return "secret_value is required"
+        if not isinstance(secret_value, str):
+            return "secret_value must be a string"
+    if action in ("approve", "deny") and not isinstance(payload.get("comment") or "", str):
+        return "comment must be a string"
+    return None
+
+
 @app.post("/api/requests/{request_id}/approve")
-def approve_request(request_id: int, payload: dict, session: Session = Depends(get_session), current_user: User = Depends(get_current_user)):
+async def approve_request(request_id: int, payload: dict, db: Database = Depends(get_db), current_user: User = Depends(get_current_user)):
     # only admin can approve
     if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Admin privileges required")
+    error = workflow_payload_error("approve", payload if isinstance(payload, dict) else {})
+    if error:
+        raise HTTPException(status_code=400, detail=error)
+    # the key provider may be remote (OpenBao): never call it from a transaction function,
+    # which runs on the event loop with DB_ASYNC
+    data_key = await run_in_threadpool(secret_box.new_data_key)
+    try:
+        return await db.run(approve_request_tx, request_id, payload, current_user, data_key)
+    finally:
+        zeroize(data_key[0])
+
+
+def approve_request_tx(session: Session, request_id: int, payload: dict, current_user: User, data_key) -> dict:
     req = session.get(SecretRequest, request_id)
     if not req:
         raise HTTPException(status_code=404, detail="Request not found")
-    if req.status not in ["pending", "in_review", "awaiting_admin"]:
+    if req.status not in OPEN_STATUSES:
         raise HTTPException(status_code=400, detail="Request already processed")
-    secret_value = payload.get("secret_value") if isinstance(payload, dict) else None
-    comment = payload.get("comment") if isinstance(payload, dict) else None
-    if not secret_value:
-        raise HTTPException(status_code=400, detail="secret_value is required")
-    secret = Secret(owner_id=req.requester_id, name=req.secret_name, value=secret_value)
+    # validated by approve_request
+    secret_value = payload["secret_value"]
+    comment = payload.get("comment")
+    secret = Secret(owner_id=req.requester_id, name=req.secret_name, value="")
+    secret.value = secret_box.encrypt(secret_value, secret_aad(secret), data_key)
     session.add(secret)
-    session.commit()
-    session.refresh(secret)
-    # mark as approved to match frontend expectations
-    req.status = "approved"
-    req.resolved_at = datetime.utcnow()
-    req.admin_comment = comment
-    req.secret_id = secret.id
-    session.add(req)
-    session.commit()
+    session.flush()
+    # mark as approved to match frontend expectations; a lost race rolls back the secret too
+    transition_request(
+        session, req, req.status,
+        status="approved", resolved_at=datetime.utcnow(), admin_comment=comment, secret_id=secret.id,
+    )
     session.add(AuditLog(user_id=current_user.id, action="approve_request", details=f"request_id: {request_id}, secret_id: {secret.id}"))
+    notify(session, req.requester_id, f"Заявка {request_id} одобрена — секрет готов к просмотру")
     session.commit()
-    notifications_cache.setdefault(req.requester_id, []).append(f"Заявка {request_id} одобрена — секрет готов к просмотру")
     return {"ok": True, "secret_id": secret.id}
+
+
 @app.get("/api/me")
-def me(current_user: User = Depends(get_current_user)):
-    return {"id": current_user.id, "username": current_user.username, "is_admin": current_user.is_admin}
+async def me(request: Request, response: Response, current_user: User = Depends(get_current_user)):
+    body = {"id": current_user.id, "username": current_user.username, "is_admin": current_user.is_admin}
+    # derived from the (cached) user itself, so no counter is needed
+    etag = 'W/"me-%s"' % hashlib.sha1(json.dumps(body, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers.update({"ETag": etag, **CACHE_HEADERS})
+    return body
 
 
 @app.post("/api/requests/{request_id}/deny")
-def deny_request(request_id: int, payload: dict, session: Session = Depends(get_session), current_user: User = Depends(get_current_user)):
+async def deny_request(request_id: int, payload: dict, db: Database = Depends(get_db), current_user: User = Depends(get_current_user)):
     # only admin can deny
     if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Admin privileges required")
+    error = workflow_payload_error("deny", payload if isinstance(payload, dict) else {})
+    if error:
+        raise HTTPException(status_code=400, detail=error)
+    return await db.run(deny_request_tx, request_id, payload, current_user)
+
+
+def deny_request_tx(session: Session, request_id: int, payload: dict, current_user: User) -> dict:
     req = session.get(SecretRequest, request_id)
     if not req:
         raise HTTPException(status_code=404, detail="Request not found")
-    if req.status not in ["pending", "in_review", "awaiting_admin"]:
+    if req.status not in OPEN_STATUSES:
         raise HTTPException(status_code=400, detail="Request already processed")
     comment = payload.get("comment") if isinstance(payload, dict) else None
-    req.status = "denied"
-    req.resolved_at = datetime.utcnow()
-    req.admin_comment = comment
-    session.add(req)
-    session.commit()
+    transition_request(session, req, req.status, status="denied", resolved_at=datetime.utcnow(), admin_comment=comment)
     session.add(AuditLog(user_id=current_user.id, action="deny_request", details=f"request_id: {request_id}"))
+    notify(session, req.requester_id, f"Заявка {request_id} отклонена")
     session.commit()
-    notifications_cache.setdefault(req.requester_id, []).append(f"Заявка {request_id} отклонена")
     return {"ok": True}
 
 
+# action -> (statuses it may start from, resulting status, audit action, notification),
+# the same rules and messages as the single-request endpoints above
+WORKFLOW_TRANSITIONS = {
+    "review": (["pending"], "in_review", "review_request", "Заявка {id} на рассмотрении"),
+    "awaiting_admin": (["in_review"], "awaiting_admin", "awaiting_admin", "Заявка {id} ожидает действий администратора"),
+    "approve": (OPEN_STATUSES, "approved", "approve_request", "Заявка {id} одобрена — секрет готов к просмотру"),
+    "deny": (OPEN_STATUSES, "denied", "deny_request", "Заявка {id} отклонена"),
+}
+BULK_MAX_OPERATIONS = int(os.getenv("BULK_MAX_OPERATIONS", "1000"))
+
+
+@app.post("/api/requests/bulk")
+async def bulk_workflow(body: BulkOperations, db: Database = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """Apply many review / awaiting_admin / approve / deny operations in one transaction.
+
+    Operations run in order, so one request may be moved through several steps. Each is
+    checked against the workflow; invalid ones are reported and skipped without affecting
+    the rest. Returns one result per operation.
+    """
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin privileges required")
+    if len(body.operations) > BULK_MAX_OPERATIONS:
+        raise HTTPException(status_code=400, detail=f"At most {BULK_MAX_OPERATIONS} operations per call")
+    # one data key per approval, fetched outside the transaction (see approve_request)
+    approvals = sum(1 for op in body.operations if op.action == "approve")
+    data_keys = await run_in_threadpool(lambda: [secret_box.new_data_key() for _ in range(approvals)])
+    try:
+        return await db.run(bulk_workflow_tx, body.operations, current_user, data_keys)
+    finally:
+        for key, _ in data_keys:
+            zeroize(key)
+
+
+def bulk_workflow_tx(session: Session, operations: list[BulkOperation], current_user: User, data_keys: list) -> dict:
+    ids = {op.request_id for op in operations}
+    requests = {r.id: r for r in session.exec(select(SecretRequest).where(SecretRequest.id.in_(ids))).all()}
+    # status as of the operations applied so far in this batch
+    statuses = {request_id: req.status for request_id, req in requests.items()}
+    results = []
+    planned = []
+    for op in operations:
+        req = requests.get(op.request_id)
+        payload = op.payload or {}
+        from_statuses, to_status, _, _ = WORKFLOW_TRANSITIONS[op.action]
+        if req is None:
+            error = "Request not found"
+        elif statuses[req.id] not in from_statuses:
+            error = f"Cannot {op.action} a request in status {statuses[req.id]}"
+        else:
+            error = workflow_payload_error(op.action, payload)
+        if error is None:
+            planned.append((len(results), op, req, payload, statuses[req.id]))
+            statuses[req.id] = to_status
+        results.append({"request_id": op.request_id, "action": op.action, "ok": error is None, "error": error})
+
+    # all new secrets in one flush
+    secrets = {}
+    for index, op, req, payload, _ in planned:
+        if op.action == "approve":
+            secret = Secret(owner_id=req.requester_id, name=req.secret_name, value="")
+            secret.value = secret_box.encrypt(payload["secret_value"], secret_aad(secret), data_keys.pop())
+            secrets[index] = secret
+    session.add_all(secrets.values())
+    session.flush()
+
+    now = datetime.utcnow()
+    audit_rows = []
+    notifications = []
+    for index, op, req, payload, from_status in planned:
+        _, to_status, audit_action, message = WORKFLOW_TRANSITIONS[op.action]
+        values = {"status": to_status}
+        if op.action in ("approve", "deny"):
+            values.update(resolved_at=now, admin_comment=payload.get("comment"))
+        if index in secrets:
+            values["secret_id"] = secrets[index].id
+        if not try_transition(session, req, from_status, **values):
+            # changed by someone else since it was loaded
+            results[index].update(ok=False, error="Request was modified concurrently")
+            if index in secrets:
+                session.delete(secrets.pop(index))
+            continue
+        details = f"request_id: {req.id}"
+        if index in secrets:
+            details += f", secret_id: {secrets[index].id}"
+            results[index]["secret_id"] = secrets[index].id
+        results[index]["status"] = to_status
+        audit_rows.append({"user_id": current_user.id, "action": audit_action, "details": details, "created_at": now})
+        notifications.append((req.requester_id, message.format(id=req.id)))
+
+    if audit_rows:
+        session.exec(insert(AuditLog), params=audit_rows)
+        notification_store.add_many(session, notifications)
+    session.commit()
+    applied = sum(1 for r in results if r["ok"])
+    return {"applied": applied, "failed": len(results) - applied, "results": results}
+
+
+@app.get("/api/stats")
+async def get_stats(
+    request: Request,
+    response: Response,
+    user_id: Optional[int] = None,
+    days: int = Query(30, ge=1, le=366),
+    current_user: User = Depends(get_current_user),
+):
+    """Request counts per status, requests created / approved / denied per day over the last
+    `days` days, and time-to-resolution percentiles.
+
+    Admins get everything (or one requester with ``?user_id=``), other users their own requests.
+    Served from counters kept up to date by every status change, so the cost does not depend
+    on the number of requests.
+    """
+    if not current_user.is_admin:
+        if user_id not in (None, current_user.id):
+            raise HTTPException(status_code=403, detail="Admin privileges required")
+        user_id = current_user.id
+    today = datetime.utcnow().date()
+    scope = "requests" if user_id is None else f"requests:{user_id}"
+    # the day is part of the tag: the window moves at midnight even if nothing changed
+    etag = await run_in_threadpool(cache_versions.etag, scope, extra=f"stats|{user_id}|{days}|{today}")
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers.update({"ETag": etag, **CACHE_HEADERS})
+    return await run_in_threadpool(summarize, workflow_stats, user_id, days, today)
+
+
+
 @app.get("/api/notifications")
-def get_notifications(current_user: User = Depends(get_current_user)):
-    return {"notifications": notifications_cache.get(current_user.id, [])}
+async def get_notifications(
+    request: Request,
+    response: Response,
+    since: Optional[int] = None,
+    db: Database = Depends(get_read_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Notifications newer than ?since= (default: the user's read cursor), oldest first.
+
+    Served from the in-memory ring buffer; pollers that send back the ETag get 304 while
+    nothing new has arrived.
+    """
+    if since is None:
+        since = await db.run(notification_store.read_cursor, current_user.id)
+    # may load or refresh the buffer from the DB
+    latest_id = await run_in_threadpool(notification_store.latest_id, current_user.id)
+    etag = f'W/"{current_user.id}-{since}-{latest_id}"'
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers.update({"ETag": etag, **CACHE_HEADERS})
+    items = notification_store.since(current_user.id, since)
+    return {"notifications": [n.to_dict() for n in items], "last_id": latest_id}
+
+
+@app.post("/api/notifications/read")
+async def mark_notifications_read(payload: NotificationsRead, db: Database = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """Advance the user's read cursor; notifications up to `last_id` are no longer returned by default."""
+    return {"last_read_id": await db.run(notification_store.mark_read, current_user.id, payload.last_id)}
+
+
+async def get_stream_user(token: Optional[str] = None, authorization: str = Header(None)) -> User:
+    """Like get_current_user, but also accepts ?token= since EventSource cannot set headers.
+
+    Uses its own short-lived session so a long-running stream does not pin a DB connection.
+    """
+    if token and not authorization:
+        authorization = f"Bearer {token}"
+    async with open_database(engine, async_engine) as db:
+        return await get_current_user(authorization, db)
+
+
+@app.get("/api/notifications/stream")
+async def stream_notifications(last_event_id: Optional[int] = Header(None), current_user: User = Depends(get_stream_user)):
+    """Server-Sent Events stream of the current user's notifications.
+
+    Reconnecting clients send Last-Event-ID (EventSource does this automatically) and
+    receive the events they missed before live ones.
+    """
+    await run_in_threadpool(notification_store.warm, current_user.id)
+
+    async def events():
+        async for event in broker.subscribe(current_user.id, last_event_id, load_since=notification_store.since):
+            if event is HEARTBEAT:
+                yield ": keepalive\n\n"
+            else:
+                yield f"id: {event.id}\nevent: notification\ndata: {event.to_json()}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+AUDIT_PAGE_SIZE = 100
+AUDIT_MAX_PAGE_SIZE = 1000
+# rows fetched per query while streaming an export
+AUDIT_EXPORT_BATCH = 1000
+AUDIT_EXPORT_FIELDS = ["id", "user_id", "action", "details", "created_at"]
+
+
+def audit_statement(user_id: Optional[int], action: Optional[str], since: Optional[datetime], until: Optional[datetime]):
+    statement = select(AuditLog)
+    if user_id is not None:
+        statement = statement.where(AuditLog.user_id == user_id)
+    if action:
+        statement = statement.where(AuditLog.action == action)
+    if since:
+        statement = statement.where(AuditLog.created_at >= since)
+    if until:
+        statement = statement.where(AuditLog.created_at < until)
+    return statement.order_by(AuditLog.created_at.desc(), AuditLog.id.desc())
+
+
+def audit_out(log: AuditLog) -> dict:
+    return {
+        "id": log.id,
+        "user_id": log.user_id,
+        "action": log.action,
+        "details": log.details,
+        "created_at": log.created_at,
+    }
+
+
+def export_audit(statement, cursor: Optional[str], fmt: str):
+    """Yield the export page by page; each page is a fresh keyset query, so memory stays flat."""
+    if fmt == "csv":
+        yield ",".join(AUDIT_EXPORT_FIELDS) + "\r\n"
+    while True:
+        page = statement.limit(AUDIT_EXPORT_BATCH)
+        if cursor:
+            page = page.where(before_cursor(AuditLog, cursor))
+        with Session(read_engine) as session:
+            logs = session.exec(page).all()
+        if not logs:
+            return
+        if fmt == "csv":
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            for log in logs:
+                writer.writerow([log.id, log.user_id, log.action, log.details, log.created_at.isoformat()])
+            yield buf.getvalue()
+        else:
+            yield ndjson(audit_out(log) for log in logs)
+        if len(logs) < AUDIT_EXPORT_BATCH:
+            return
+        cursor = encode_cursor(logs[-1].created_at, logs[-1].id)
 
 
 @app.get("/api/audit")
-def get_audit(session: Session = Depends(get_session), current_user: User = Depends(get_current_user)):
+async def get_audit(
+    request: Request,
+    user_id: Optional[int] = None,
+    action: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(AUDIT_PAGE_SIZE, ge=1, le=AUDIT_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    format: Optional[str] = Query(None, pattern="^(ndjson|csv)$"),
+    db: Database = Depends(get_read_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Audit log newest first, filtered by user, action and [since, until).
+
+    Pages like /api/requests (X-Next-Cursor). With ?format=ndjson or ?format=csv the whole
+    filtered log is streamed instead, ignoring ?limit.
+    """
     if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Admin privileges required")
-    logs = session.exec(select(AuditLog).order_by(AuditLog.created_at.desc())).all()
-    return logs
+    statement = audit_statement(user_id, action, since, until)
+    if format:
+        media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+        return StreamingResponse(
+            export_audit(statement, cursor, format),
+            media_type=media_type,
+            headers={"Content-Disposition": f'attachment; filename="audit.{format}"'},
+        )
+    etag = await replica_view_etag("audit", extra=str(request.query_params))
+    if etag and etag_matches(request, etag):
+        return not_modified(etag)
+    page = admin_view_cache.get(etag) if etag else None
+    if page is None:
+        if cursor:
+            statement = statement.where(before_cursor(AuditLog, cursor))
+        logs = await db.run(fetch_all, statement.limit(limit + 1))
+        next_cursor = None
+        if len(logs) > limit:
+            logs = logs[:limit]
+            next_cursor = encode_cursor(logs[-1].created_at, logs[-1].id)
+        page = (dumps([audit_out(log) for log in logs]), next_cursor)
+        if etag:
+            admin_view_cache.put(etag, page)
+    body, next_cursor = page
+    return list_response(body, next_cursor, etag)
+
+
+SECRETS_PAGE_SIZE = 100
+SECRETS_MAX_PAGE_SIZE = 500
+
+
+@app.get("/api/secrets", response_model=List[SecretOut])
+async def list_secrets(
+    owner_id: Optional[int] = None,
+    name: Optional[str] = None,
+    limit: int = Query(SECRETS_PAGE_SIZE, ge=1, le=SECRETS_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: Database = Depends(get_read_db),
+    current_user: User = Depends(get_current_user),
+):
+    """List secret metadata newest first, paginated like /api/requests (``X-Next-Cursor``).
+
+    Values are never included; fetch one through ``/api/secrets/{id}``, which is audited.
+    Admins see every secret and may filter by ``owner_id``; other users see their own.
+    """
+    if not current_user.is_admin:
+        owner_id = current_user.id
+    rows, next_cursor = await db.run(list_secrets_page, owner_id, name, limit, cursor)
+    return list_response(rows, next_cursor)
+
+
+def list_secrets_page(
+    session: Session, owner_id: Optional[int], name: Optional[str], limit: int, cursor: Optional[str],
+) -> tuple[list[dict], Optional[str]]:
+    # metadata columns only: the (possibly large) encrypted value is never loaded
+    statement = (
+        select(Secret.id, Secret.name, Secret.owner_id, Secret.created_at, User.username)
+        .join(User, User.id == Secret.owner_id, isouter=True)
+    )
+    if owner_id is not None:
+        statement = statement.where(Secret.owner_id == owner_id)
+    if name:
+        statement = statement.where(Secret.name == name)
+    if cursor:
+        statement = statement.where(before_cursor(Secret, cursor))
+    statement = statement.order_by(Secret.created_at.desc(), Secret.id.desc()).limit(limit + 1)
+    rows = session.exec(statement).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+    return [
+        {"id": r.id, "name": r.name, "owner_id": r.owner_id, "owner_username": r.username, "created_at": r.created_at}
+        for r in rows
+    ], next_cursor
+
+
+@app.get("/api/secrets/{secret_id}")
+async def get_secret(secret_id: int, db: Database = Depends(get_db), current_user: User = Depends(get_current_user)):
+    body, stored, aad = await db.run(get_secret_tx, secret_id, current_user)
+    # unwrapping may call the key provider over the network: keep it off the event loop
+    body["value"] = await run_in_threadpool(secret_box.decrypt, stored, aad)
+    return body
+
+
+def get_secret_tx(session: Session, secret_id: int, current_user: User) -> tuple[dict, str, str]:
+    """The secret's metadata and its sealed value with AAD, decrypted by the caller."""
+    secret = session.get(Secret, secret_id)
+    if not secret:
+        raise HTTPException(status_code=404, detail="Secret not found")
+    # only the owner or an admin can view the secret
+    if not (current_user.is_admin or current_user.id == secret.owner_id):
+        raise HTTPException(status_code=403, detail="Not authorized to view this secret")
+    audit_writer.record(current_user.id, "view_secret", f"secret_id: {secret.id}")
+    return {"id": secret.id, "name": secret.name}, secret.value, secret_aad(secret)
 
 
-@app.get("/api/secrets")
-def list_secrets(session: Session = Depends(get_session), current_user: User = Depends(get_current_user)):
-    if current_user.is_admin:
-        statement = select(Secret)
-    else:
-        statement = select(Secret).where(Secret.owner_id == current_user.id)
-    results = session.exec(statement).all()
-    return results
+@app.get("/api/requests/{request_id}/secret")
+async def get_request_secret(request_id: int, db: Database = Depends(get_db), current_user: User = Depends(get_current_user)):
+    stored, aad = await db.run(get_request_secret_tx, request_id, current_user)
+    return {"secret": await run_in_threadpool(secret_box.decrypt, stored, aad)}
 
 
-@app.get("/api/requests/{request_id}/secret")
-def get_request_secret(request_id: int, session: Session = Depends(get_session), current_user: User = Depends(get_current_user)):
+def get_request_secret_tx(session: Session, request_id: int, current_user: User) -> tuple[str, str]:
+    """The approved secret's sealed value and AAD, decrypted by the caller (see get_secret)."""
     req = session.get(SecretRequest, request_id)
     if not req:
         raise HTTPException(status_code=404, detail="Request not found")
@@ -386,7 +1244,6 @@ def get_request_secret(request_id: int, session: Session = Depends(get_session),
     secret = session.get(Secret, req.secret_id)
     if not secret:
         raise HTTPException(status_code=404, detail="Secret not found")
-    # Audit the view
-    session.add(AuditLog(user_id=current_user.id, action="view_secret", details=f"request_id: {request_id}, secret_id: {secret.id}"))
-    session.commit()
-    return {"secret": secret.value}
+    # Audit the view (no state change to commit with, so it goes through the batched writer)
+    audit_writer.record(current_user.id, "view_secret", f"request_id: {request_id}, secret_id: {secret.id}")
+    return secret.value, secret_aad(secret)
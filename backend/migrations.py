@@ -0,0 +1,139 @@
+import logging
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from sqlmodel import SQLModel, Field
+
+# Versioned schema migrations. The `schemaversion` table holds the number of migrations applied;
+# workers compare it with len(MIGRATIONS) using one query at startup instead of running
+# create_all (which reflects every table) on each boot.
+#
+# A fresh database gets the current models through create_all and is stamped as up to date, so
+# migrations only ever run against databases created by older versions. Append new migrations
+# at the end; never edit or reorder applied ones. Migrations receive the connection and the
+# full SQLModel metadata (all model modules are imported by then, see bootstrap.py).
+
+logger = logging.getLogger(__name__)
+
+# arbitrary key for pg_advisory_xact_lock, serializing concurrent migrators
+PG_LOCK_ID = 0x6B6873
+
+
+class SchemaVersion(SQLModel, table=True):
+    id: int = Field(default=1, primary_key=True)
+    version: int = 0
+
+
+@dataclass
+class Migration:
+    description: str
+    apply: Callable
+
+
+def _create_tables(conn, metadata):
+    # tables that did not exist before migrations (sessions, notifications, rate limits, ...)
+    metadata.create_all(conn, checkfirst=True)
+
+
+def _create_indexes(*names: str) -> Callable:
+    def apply(conn, metadata):
+        for table in metadata.sorted_tables:
+            for index in table.indexes:
+                if index.name in names:
+                    index.create(conn, checkfirst=True)
+
+    return apply
+
+
+def _sql(*statements: str) -> Callable:
+    def apply(conn, metadata):
+        for statement in statements:
+            conn.execute(text(statement))
+
+    return apply
+
+
+MIGRATIONS = [
+    Migration("create missing tables", _create_tables),
+    Migration("add listing indexes declared after the tables were created", _create_indexes(
+        "ix_secret_created_at", "ix_secret_owner_id_created_at", "ix_secret_name",
+        "ix_secretrequest_requester_id_created_at", "ix_secretrequest_status_created_at",
+        "ix_auditlog_created_at", "ix_auditlog_user_id_created_at", "ix_auditlog_action_created_at",
+        "ix_notification_user_id_id",
+    )),
+    # ix_auditlog_action_created_at serves the same lookups; this one only slowed down inserts
+    Migration("drop ix_auditlog_action", _sql("DROP INDEX IF EXISTS ix_auditlog_action")),
+    # unfiltered admin listing (all=true) scanned and sorted the whole table (found by inspect_db.py)
+    Migration("add ix_secretrequest_created_at", _create_indexes("ix_secretrequest_created_at")),
+]
+LATEST_VERSION = len(MIGRATIONS)
+
+
+def schema_version(engine) -> Optional[int]:
+    """Applied migration count, or None for a database without the version table."""
+    try:
+        with engine.connect() as conn:
+            return conn.execute(text("SELECT version FROM schemaversion WHERE id = 1")).scalar() or 0
+    except (OperationalError, ProgrammingError):
+        return None
+
+
+def _lock(conn):
+    """Start the migration transaction holding a database-wide write lock."""
+    if conn.dialect.name == "sqlite":
+        # the stdlib driver would only BEGIN at the first DML statement, leaving DDL unprotected
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+    elif conn.dialect.name == "postgresql":
+        conn.exec_driver_sql(f"SELECT pg_advisory_xact_lock({PG_LOCK_ID})")
+
+
+def migrate(engine, metadata) -> list[str]:
+    """Bring the schema up to date; returns the descriptions of the migrations applied.
+
+    Runs in one transaction under a lock, so concurrent callers apply each migration once
+    (the others wait, then find nothing to do).
+    """
+    applied = []
+    with engine.connect() as conn:
+        _lock(conn)
+        has_version_table = inspect(conn).has_table(SchemaVersion.__tablename__)
+        version = conn.execute(text("SELECT version FROM schemaversion WHERE id = 1")).scalar() if has_version_table else None
+        if version is None:
+            fresh = not inspect(conn).get_table_names()
+            SchemaVersion.__table__.create(conn, checkfirst=True)
+            if fresh:
+                metadata.create_all(conn)
+                conn.execute(SchemaVersion.__table__.insert().values(id=1, version=LATEST_VERSION))
+                conn.commit()
+                return ["create schema"]
+            # created before migrations existed: run them all
+            conn.execute(SchemaVersion.__table__.insert().values(id=1, version=0))
+            version = 0
+        for number, migration in enumerate(MIGRATIONS[version:], version + 1):
+            logger.info("Applying migration %d: %s", number, migration.description)
+            migration.apply(conn, metadata)
+            applied.append(migration.description)
+        if applied:
+            conn.execute(SchemaVersion.__table__.update().where(SchemaVersion.id == 1).values(version=LATEST_VERSION))
+        conn.commit()
+    return applied
+
+
+class SchemaOutdated(RuntimeError):
+    pass
+
+
+def ensure_schema(engine, metadata, auto_migrate: bool):
+    """Startup check: one query when the schema is current. Otherwise migrate, or with
+    `auto_migrate` off raise SchemaOutdated so a deployment step (bootstrap.py) does it."""
+    version = schema_version(engine)
+    if version == LATEST_VERSION:
+        return
+    if version is not None and version > LATEST_VERSION:
+        raise SchemaOutdated(f"Database schema version {version} is newer than this code ({LATEST_VERSION})")
+    if not auto_migrate:
+        raise SchemaOutdated(f"Database schema version {version or 0}, expected {LATEST_VERSION}: run python bootstrap.py")
+    for description in migrate(engine, metadata):
+        logger.info("Migrated: %s", description)
@@ -0,0 +1,534 @@
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from queue import Full, Queue
+from typing import AsyncIterator, Callable, Optional
+
+from sqlalchemy import Index, event
+from sqlmodel import SQLModel, Field, Session, select as sql_select
+
+# Notification subsystem: durable table, bounded per-user ring buffers, read cursors,
+# and brokers that fan events out to /api/notifications/stream subscribers.
+# Brokers are published to from sync handlers (threadpool) and consumed by asyncio subscribers.
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT = object()
+_CLOSED = object()
+
+
+class NotificationRecord(SQLModel, table=True):
+    __tablename__ = "notification"
+    __table_args__ = (Index("ix_notification_user_id_id", "user_id", "id"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int
+    message: str
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class NotificationCursor(SQLModel, table=True):
+    user_id: int = Field(primary_key=True)
+    last_read_id: int = 0
+
+
+@dataclass
+class Notification:
+    id: int
+    user_id: int
+    message: str
+    created_at: datetime = field(default_factory=datetime.utcnow)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "user_id": self.user_id,
+            "message": self.message,
+            "created_at": self.created_at.isoformat(),
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, payload: str) -> "Notification":
+        data = json.loads(payload)
+        return cls(
+            id=data["id"],
+            user_id=data["user_id"],
+            message=data["message"],
+            created_at=datetime.fromisoformat(data["created_at"]),
+        )
+
+    @classmethod
+    def from_record(cls, record: NotificationRecord) -> "Notification":
+        return cls(id=record.id, user_id=record.user_id, message=record.message, created_at=record.created_at)
+
+
+class NotificationBuffer:
+    """Per-user ring buffers of the newest `size` notifications, for at most `max_users` users (LRU).
+
+    A user is only present once seeded from the database, so a present buffer that is not
+    full holds the user's complete history. Events appended while a user is being loaded
+    (between `begin_load` and `seed`) are queued and merged into the seed, so an event that
+    commits after the loading query but before the seed is not lost.
+    """
+
+    def __init__(self, size: int = 100, max_users: int = 10_000):
+        self.size = size
+        self.max_users = max_users
+        self._lock = threading.Lock()
+        self._buffers: OrderedDict[int, deque[Notification]] = OrderedDict()
+        # user_id -> [concurrent loaders, events appended meanwhile]
+        self._loading: dict[int, list] = {}
+        # user_id -> monotonic time the buffer was last loaded or refreshed from the DB
+        self._checked_at: dict[int, float] = {}
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._buffers)
+
+    def __contains__(self, user_id: int) -> bool:
+        with self._lock:
+            return user_id in self._buffers
+
+    def get(self, user_id: int) -> Optional[list[Notification]]:
+        with self._lock:
+            buf = self._buffers.get(user_id)
+            if buf is None:
+                return None
+            self._buffers.move_to_end(user_id)
+            return list(buf)
+
+    def begin_load(self, user_id: int):
+        """Call before querying the events passed to `seed`; end with `seed` or `cancel_load`."""
+        with self._lock:
+            self._loading.setdefault(user_id, [0, []])[0] += 1
+
+    def cancel_load(self, user_id: int):
+        with self._lock:
+            self._end_load(user_id)
+
+    def _end_load(self, user_id: int) -> list[Notification]:
+        loading = self._loading.get(user_id)
+        if loading is None:
+            return []
+        loading[0] -= 1
+        if loading[0] <= 0:
+            del self._loading[user_id]
+        return loading[1]
+
+    def seed(self, user_id: int, events: list[Notification]):
+        with self._lock:
+            queued = self._end_load(user_id)
+            if user_id in self._buffers:
+                return
+            merged = {e.id: e for e in [*events, *queued]}
+            self._buffers[user_id] = deque(sorted(merged.values(), key=lambda e: e.id)[-self.size:], maxlen=self.size)
+            self._checked_at[user_id] = time.monotonic()
+            while len(self._buffers) > self.max_users:
+                evicted, _ = self._buffers.popitem(last=False)
+                self._checked_at.pop(evicted, None)
+
+    def clear(self):
+        """Drop every buffer; users are seeded from the database again on their next read."""
+        with self._lock:
+            self._buffers.clear()
+            self._checked_at.clear()
+
+    def claim_refresh(self, user_id: int, interval: float) -> Optional[int]:
+        """Newest buffered id if the user's buffer was last checked `interval` or more seconds ago
+        (and mark it checked), else None. At most one caller per interval gets the id."""
+        with self._lock:
+            buf = self._buffers.get(user_id)
+            now = time.monotonic()
+            if buf is None or now - self._checked_at.get(user_id, 0.0) < interval:
+                return None
+            self._checked_at[user_id] = now
+            return buf[-1].id if buf else 0
+
+    def append(self, event: Notification):
+        """Add an event for an already-seeded user; unseeded users load it from the DB later."""
+        with self._lock:
+            buf = self._buffers.get(event.user_id)
+            if buf is None:
+                loading = self._loading.get(event.user_id)
+                if loading is not None:
+                    loading[1].append(event)
+                return
+            if any(e.id == event.id for e in buf):
+                return
+            if buf and buf[-1].id > event.id:
+                # events from other workers may arrive slightly out of order
+                self._buffers[event.user_id] = deque(sorted([*buf, event], key=lambda e: e.id)[-self.size:], maxlen=self.size)
+            else:
+                buf.append(event)
+
+
+class InProcessBroker:
+    """Default broker: fans notifications out to subscribers of this process only.
+
+    A subscriber whose queue overflows is closed; the client is expected to reconnect
+    and resume from the buffer instead of silently losing events.
+    """
+
+    def __init__(self, buffer: NotificationBuffer, queue_size: int = 100):
+        self.buffer = buffer
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscribers: dict[int, set[asyncio.Queue]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+
+    def stop(self):
+        self._loop = None
+
+    def publish(self, event: Notification):
+        self._deliver(event)
+
+    def _deliver(self, event: Notification):
+        self.buffer.append(event)
+        with self._lock:
+            queues = list(self._subscribers.get(event.user_id, ()))
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        for queue in queues:
+            loop.call_soon_threadsafe(self._put, queue, event)
+
+    @staticmethod
+    def _put(queue: asyncio.Queue, event: Notification):
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # slow consumer: drop its backlog and close it so it resumes from the buffer
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(_CLOSED)
+
+    async def subscribe(
+        self, user_id: int, last_event_id: Optional[int] = None, heartbeat: float = 15.0,
+        load_since: Optional[Callable[[int, int], list[Notification]]] = None,
+    ) -> AsyncIterator:
+        """Yield events for `user_id` as they are published, preceded by the events newer than
+        `last_event_id`. Yields HEARTBEAT after `heartbeat` idle seconds.
+
+        The missed events come from `load_since(user_id, since_id)` (NotificationStore.since,
+        run in a thread) page by page, so an id older than the buffer is replayed from the
+        table; without it only what is still buffered is replayed."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(queue)
+        try:
+            seen = set()
+            cursor = last_event_id
+            while cursor is not None:
+                if load_since is None:
+                    backlog = [e for e in self.buffer.get(user_id) or () if e.id > cursor]
+                else:
+                    backlog = await asyncio.to_thread(load_since, user_id, cursor)
+                for item in backlog:
+                    seen.add(item.id)
+                    yield item
+                if load_since is None or len(backlog) < self.buffer.size:
+                    break
+                cursor = backlog[-1].id
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield HEARTBEAT
+                    continue
+                if item is _CLOSED:
+                    return
+                if item.id in seen:
+                    continue
+                yield item
+        finally:
+            with self._lock:
+                subscribers = self._subscribers.get(user_id)
+                if subscribers is not None:
+                    subscribers.discard(queue)
+                    if not subscribers:
+                        del self._subscribers[user_id]
+
+
+class PostgresBroker(InProcessBroker):
+    """Broker shared by all workers through Postgres LISTEN/NOTIFY.
+
+    Every worker LISTENs on the channel and feeds received events into its own buffer and
+    subscribers, so buffers stay current across workers. Ids are notification table ids.
+
+    `publish` delivers locally and hands the NOTIFY to a publisher thread, so a commit (on the
+    event loop with DB_ASYNC) never waits for a Postgres round trip. A failed NOTIFY reconnects
+    and retries once; after that, or with `publish_queue_size` NOTIFYs already waiting, the event
+    reaches other workers only through their next buffer load, logged and counted in
+    `publish_errors`. The listener reconnects with exponential backoff (`reconnect_delay` up
+    to `max_reconnect_delay` seconds) and then drops all buffers, which reload from the table
+    with anything missed while it was disconnected.
+    """
+
+    CHANNEL = "notifications"
+
+    def __init__(
+        self, buffer: NotificationBuffer, dsn: str, publish_queue_size: int = 10_000,
+        reconnect_delay: float = 1.0, max_reconnect_delay: float = 30.0, **kwargs,
+    ):
+        super().__init__(buffer, **kwargs)
+        self.dsn = dsn
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.publish_errors = 0
+        self._publish_conn = None
+        self._publish_lock = threading.Lock()
+        self._outbox: Queue = Queue(maxsize=publish_queue_size)
+        self._publisher: Optional[threading.Thread] = None
+        self._listener: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    def _connect(self):
+        import psycopg2
+
+        conn = psycopg2.connect(self.dsn)
+        conn.autocommit = True
+        return conn
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        super().start(loop)
+        self._stopping.clear()
+        self._listener = threading.Thread(target=self._listen, name="notifications-listener", daemon=True)
+        self._listener.start()
+        self._publisher = threading.Thread(target=self._publish_loop, name="notifications-publisher", daemon=True)
+        self._publisher.start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._publisher is not None:
+            # sends whatever is still queued first
+            self._outbox.put(_CLOSED)
+            self._publisher.join(timeout=5)
+            self._publisher = None
+        if self._listener is not None:
+            self._listener.join(timeout=5)
+            self._listener = None
+        with self._publish_lock:
+            self._close_publish_conn()
+        super().stop()
+
+    def _listen(self):
+        import psycopg2
+
+        delay = self.reconnect_delay
+        connected_before = False
+        while not self._stopping.is_set():
+            try:
+                conn = self._connect()
+            except psycopg2.Error:
+                logger.warning("Notification listener cannot connect, retrying in %.0fs", delay, exc_info=True)
+            else:
+                try:
+                    with conn.cursor() as cur:
+                        cur.execute(f"LISTEN {self.CHANNEL}")
+                    if connected_before:
+                        # events published while disconnected never reached this worker
+                        self.buffer.clear()
+                        logger.info("Notification listener reconnected")
+                    connected_before = True
+                    delay = self.reconnect_delay
+                    while not self._stopping.is_set():
+                        if select.select([conn], [], [], 1.0) == ([], [], []):
+                            continue
+                        conn.poll()
+                        while conn.notifies:
+                            self._deliver(Notification.from_json(conn.notifies.pop(0).payload))
+                    return
+                except psycopg2.Error:
+                    logger.warning("Notification listener lost its connection, reconnecting in %.0fs", delay, exc_info=True)
+                finally:
+                    conn.close()
+            if self._stopping.wait(delay):
+                return
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    def publish(self, event: Notification):
+        # deliver locally right away; the echo from our own listener is deduplicated by id
+        self._deliver(event)
+        if self._publisher is None:
+            # not started (scripts, tests): nothing runs the outbox, send inline
+            self._send(event.to_json())
+            return
+        try:
+            self._outbox.put_nowait(event.to_json())
+        except Full:
+            self.publish_errors += 1
+            logger.error("Notification publish queue full: notification %d not sent to other workers", event.id)
+
+    def _publish_loop(self):
+        while True:
+            payload = self._outbox.get()
+            if payload is _CLOSED:
+                return
+            self._send(payload)
+
+    def _send(self, payload: str):
+        import psycopg2
+
+        with self._publish_lock:
+            for attempt in (1, 2):
+                try:
+                    if self._publish_conn is None:
+                        self._publish_conn = self._connect()
+                    with self._publish_conn.cursor() as cur:
+                        cur.execute("SELECT pg_notify(%s, %s)", (self.CHANNEL, payload))
+                    return
+                except psycopg2.Error:
+                    # a dropped connection would fail every later NOTIFY: reconnect next time
+                    self._close_publish_conn()
+                    if attempt == 2:
+                        self.publish_errors += 1
+                        logger.exception("Failed to send a notification to other workers")
+
+    def _close_publish_conn(self):
+        if self._publish_conn is not None:
+            try:
+                self._publish_conn.close()
+            except Exception:
+                pass
+            self._publish_conn = None
+
+
+def create_broker(kind: str, buffer: NotificationBuffer, dsn: Optional[str] = None) -> InProcessBroker:
+    if kind == "memory":
+        return InProcessBroker(buffer)
+    if kind == "postgres":
+        if not dsn:
+            raise ValueError("NOTIFICATION_BROKER=postgres requires a Postgres DATABASE_URL")
+        return PostgresBroker(buffer, dsn)
+    raise ValueError(f"Unknown notification broker: {kind}")
+
+
+class NotificationStore:
+    """Durable notifications with an in-memory read path.
+
+    `add` writes the row in the caller's transaction; the event is published to the
+    broker (and so to buffers and streams) only after that transaction commits.
+
+    The memory broker only sees this process's notifications. With `refresh_interval` > 0,
+    a buffer older than that many seconds is topped up with rows committed since its newest
+    one (one indexed query), which bounds how stale polls are when other workers write.
+
+    Publishing runs inside SQLAlchemy's after_commit dispatch, after the rows are durable: a
+    broker error is logged and counted in `publish_errors`, never raised, since raising there
+    would fail a committed request and skip the after_commit listeners registered after this one.
+    """
+
+    def __init__(self, engine, broker: InProcessBroker, refresh_interval: float = 0):
+        self.engine = engine
+        self.broker = broker
+        self.buffer = broker.buffer
+        self.refresh_interval = refresh_interval
+        self.publish_errors = 0
+        event.listen(Session, "after_commit", self._after_commit)
+        event.listen(Session, "after_rollback", self._after_rollback)
+
+    def add(self, session: Session, user_id: int, message: str) -> NotificationRecord:
+        record = NotificationRecord(user_id=user_id, message=message)
+        session.add(record)
+        session.flush()
+        session.info.setdefault("pending_notifications", []).append(Notification.from_record(record))
+        return record
+
+    def add_many(self, session: Session, items: list[tuple[int, str]]) -> list[NotificationRecord]:
+        """Like `add` for (user_id, message) pairs, with a single flush."""
+        records = [NotificationRecord(user_id=user_id, message=message) for user_id, message in items]
+        session.add_all(records)
+        session.flush()
+        session.info.setdefault("pending_notifications", []).extend(Notification.from_record(r) for r in records)
+        return records
+
+    def _after_commit(self, session):
+        for pending in session.info.pop("pending_notifications", ()):
+            try:
+                self.broker.publish(pending)
+            except Exception:
+                self.publish_errors += 1
+                logger.exception("Failed to publish notification %d for user %d", pending.id, pending.user_id)
+
+    def _after_rollback(self, session):
+        session.info.pop("pending_notifications", None)
+
+    def warm(self, user_id: int) -> list[Notification]:
+        """Return the user's buffered notifications, loading them from the DB on a miss."""
+        events = self.buffer.get(user_id)
+        if events is None:
+            self.buffer.begin_load(user_id)
+            try:
+                with Session(self.engine) as session:
+                    records = session.exec(
+                        sql_select(NotificationRecord)
+                        .where(NotificationRecord.user_id == user_id)
+                        .order_by(NotificationRecord.id.desc())
+                        .limit(self.buffer.size)
+                    ).all()
+            except BaseException:
+                self.buffer.cancel_load(user_id)
+                raise
+            self.buffer.seed(user_id, [Notification.from_record(r) for r in records])
+            events = self.buffer.get(user_id) or []
+        elif self.refresh_interval > 0:
+            newest_id = self.buffer.claim_refresh(user_id, self.refresh_interval)
+            if newest_id is not None:
+                with Session(self.engine) as session:
+                    records = session.exec(
+                        sql_select(NotificationRecord)
+                        .where(NotificationRecord.user_id == user_id, NotificationRecord.id > newest_id)
+                        .order_by(NotificationRecord.id.desc())
+                        .limit(self.buffer.size)
+                    ).all()
+                for record in reversed(records):
+                    self.buffer.append(Notification.from_record(record))
+                if records:
+                    events = self.buffer.get(user_id) or []
+        return events
+
+    def latest_id(self, user_id: int) -> int:
+        events = self.warm(user_id)
+        return events[-1].id if events else 0
+
+    def since(self, user_id: int, since_id: int) -> list[Notification]:
+        """Notifications newer than `since_id`, oldest first, at most one buffer's worth."""
+        events = self.warm(user_id)
+        if len(events) < self.buffer.size or since_id >= events[0].id:
+            return [e for e in events if e.id > since_id]
+        # the buffer may have dropped some of the requested range
+        with Session(self.engine) as session:
+            records = session.exec(
+                sql_select(NotificationRecord)
+                .where(NotificationRecord.user_id == user_id, NotificationRecord.id > since_id)
+                .order_by(NotificationRecord.id)
+                .limit(self.buffer.size)
+            ).all()
+        return [Notification.from_record(r) for r in records]
+
+    def read_cursor(self, session: Session, user_id: int) -> int:
+        cursor = session.get(NotificationCursor, user_id)
+        return cursor.last_read_id if cursor else 0
+
+    def mark_read(self, session: Session, user_id: int, last_id: int) -> int:
+        cursor = session.get(NotificationCursor, user_id)
+        if cursor is None:
+            cursor = NotificationCursor(user_id=user_id, last_read_id=last_id)
+        else:
+            # cursors only move forward
+            cursor.last_read_id = max(cursor.last_read_id, last_id)
+        session.add(cursor)
+        session.commit()
+        return cursor.last_read_id
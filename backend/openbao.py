@@ -0,0 +1,30 @@
+import base64
+
+import httpx
+
+# Key provider backed by the OpenBao (Vault-compatible) transit secrets engine: the master key
+# never leaves OpenBao; data keys are generated and unwrapped through its HTTP API.
+# Calls are blocking network round-trips: the API makes them from the threadpool, outside its
+# transaction functions (those run on the event loop with DB_ASYNC).
+
+
+class OpenBaoKeyProvider:
+    name = "openbao"
+
+    def __init__(self, addr: str, token: str, key_name: str, mount: str = "transit", timeout: float = 5.0):
+        self.key_name = key_name
+        self.mount = mount
+        self._client = httpx.Client(base_url=addr.rstrip("/"), headers={"X-Vault-Token": token}, timeout=timeout)
+
+    def _post(self, path: str, payload: dict) -> dict:
+        r = self._client.post(f"/v1/{self.mount}/{path}/{self.key_name}", json=payload)
+        r.raise_for_status()
+        return r.json()["data"]
+
+    def generate_data_key(self) -> tuple[bytearray, bytes]:
+        data = self._post("datakey/plaintext", {"bits": 256})
+        return bytearray(base64.b64decode(data["plaintext"])), data["ciphertext"].encode("ascii")
+
+    def unwrap(self, wrapped: bytes) -> bytearray:
+        data = self._post("decrypt", {"ciphertext": wrapped.decode("ascii")})
+        return bytearray(base64.b64decode(data["plaintext"]))
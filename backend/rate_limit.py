@@ -0,0 +1,178 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Callable, Optional
+
+from sqlalchemy import delete, update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import SQLModel, Field, Session
+
+# Login throttling: token buckets keyed by client IP and by username, plus exponential
+# backoff after repeated failures. "memory" limits per process; "database" shares the
+# buckets between workers through a table updated with optimistic (versioned) writes.
+
+
+class RateLimited(Exception):
+    """Raised when a key is out of tokens or backing off; retry after `retry_after` seconds."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Too many attempts")
+        self.retry_after = retry_after
+
+
+class LoginThrottle(SQLModel, table=True):
+    key: str = Field(primary_key=True)
+    tokens: Optional[float] = None
+    updated_at: float = Field(default=0.0, index=True)
+    failures: int = 0
+    blocked_until: float = 0.0
+    version: int = 0
+
+
+@dataclass
+class BucketState:
+    # None = full bucket (capacity is only known per rule)
+    tokens: Optional[float] = None
+    updated_at: float = 0.0
+    failures: int = 0
+    blocked_until: float = 0.0
+
+
+class MemoryRateLimiter:
+    """In-process token buckets for at most `max_keys` keys (LRU).
+
+    `hit` takes one token from a bucket of `capacity` refilled at `per_second`;
+    after `backoff_after` consecutive failures a key is blocked for `backoff_base` seconds,
+    doubling with every further failure up to `backoff_max`.
+    """
+
+    def __init__(self, backoff_after: int = 3, backoff_base: float = 1.0, backoff_max: float = 300.0, max_keys: int = 100_000):
+        self.backoff_after = backoff_after
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_keys = max_keys
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, BucketState] = OrderedDict()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def _modify(self, key: str, fn: Callable[[BucketState, float], Optional[float]]) -> Optional[float]:
+        """Apply `fn(state, now)` to the key's state and save it, unless `fn` returns a value
+        (a retry-after, or 0 for "nothing changed"), which is passed through unsaved."""
+        with self._lock:
+            state = self._entries.get(key)
+            if state is None:
+                state = BucketState()
+            result = fn(state, time.time())
+            if result is None:
+                self._entries[key] = state
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_keys:
+                    self._entries.popitem(last=False)
+            return result
+
+    def hit(self, key: str, capacity: float, per_second: float):
+        """Take a token for `key` or raise RateLimited."""
+
+        def take(state: BucketState, now: float) -> Optional[float]:
+            if state.blocked_until > now:
+                return state.blocked_until - now
+            tokens = capacity if state.tokens is None else min(capacity, state.tokens + (now - state.updated_at) * per_second)
+            if tokens < 1:
+                return (1 - tokens) / per_second
+            state.tokens = tokens - 1
+            state.updated_at = now
+            return None
+
+        retry_after = self._modify(key, take)
+        if retry_after is not None:
+            self.rejected += 1
+            raise RateLimited(max(1, math.ceil(retry_after)))
+
+    def failure(self, key: str):
+        def fail(state: BucketState, now: float) -> None:
+            state.failures += 1
+            if state.failures >= self.backoff_after:
+                delay = min(self.backoff_max, self.backoff_base * 2 ** (state.failures - self.backoff_after))
+                state.blocked_until = now + delay
+
+        self._modify(key, fail)
+
+    def success(self, key: str):
+        def reset(state: BucketState, now: float) -> Optional[float]:
+            if not state.failures and not state.blocked_until:
+                return 0.0
+            state.failures = 0
+            state.blocked_until = 0.0
+            return None
+
+        self._modify(key, reset)
+
+
+class DatabaseRateLimiter(MemoryRateLimiter):
+    """Buckets shared by all workers via the `loginthrottle` table.
+
+    Each change is a read followed by an UPDATE conditional on the row version, retried
+    on conflict, so concurrent workers never lose a token or a failure.
+    """
+
+    RETRIES = 5
+    # drop rows idle for this long (their buckets are full again) once every PURGE_EVERY writes
+    IDLE_SECONDS = 24 * 3600
+    PURGE_EVERY = 1000
+
+    def __init__(self, engine, **kwargs):
+        super().__init__(**kwargs)
+        self.engine = engine
+        self._writes = 0
+
+    def _modify(self, key: str, fn: Callable[[BucketState, float], Optional[float]]) -> Optional[float]:
+        for _ in range(self.RETRIES):
+            with Session(self.engine) as session:
+                row = session.get(LoginThrottle, key)
+                state = BucketState() if row is None else BucketState(row.tokens, row.updated_at, row.failures, row.blocked_until)
+                result = fn(state, time.time())
+                if result is not None:
+                    return result
+                if row is None:
+                    session.add(LoginThrottle(key=key, version=1, **asdict(state)))
+                    try:
+                        session.commit()
+                    except IntegrityError:
+                        # another worker created the row first
+                        continue
+                else:
+                    updated = session.exec(
+                        update(LoginThrottle)
+                        .where(LoginThrottle.key == key, LoginThrottle.version == row.version)
+                        .values(version=row.version + 1, **asdict(state))
+                    ).rowcount
+                    session.commit()
+                    if updated != 1:
+                        continue
+                self._writes += 1
+                if self._writes % self.PURGE_EVERY == 0:
+                    self._purge(session)
+                return None
+        # persistent contention on one key: treat it as rate limited rather than let it through
+        return 1.0
+
+    def _purge(self, session: Session):
+        now = time.time()
+        session.exec(delete(LoginThrottle).where(
+            LoginThrottle.updated_at < now - self.IDLE_SECONDS, LoginThrottle.blocked_until < now,
+        ))
+        session.commit()
+
+
+def create_rate_limiter(kind: str, engine, **kwargs) -> MemoryRateLimiter:
+    if kind == "memory":
+        return MemoryRateLimiter(**kwargs)
+    if kind == "database":
+        return DatabaseRateLimiter(engine, **kwargs)
+    raise ValueError(f"Unknown rate limiter: {kind}")
@@ -0,0 +1,163 @@
+import json
+import zlib
+from datetime import date
+from typing import Any, Iterable, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Fast path for large list responses. Handlers that build their rows themselves (plain dicts of
+# str / int / datetime) return FastJSONResponse, which FastAPI sends as is: no response_model
+# validation round trip, and orjson instead of the stdlib encoder. CompressionMiddleware then
+# gzip- or brotli-encodes bodies above a size threshold, chunk by chunk for streamed exports.
+# orjson and brotli are optional: without them the stdlib encoder and gzip only are used.
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/csv", "text/plain", "text/html")
+
+
+def _default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json")
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Compact UTF-8 JSON, byte-for-byte what FastAPI's JSONResponse sends for the same rows."""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def ndjson(rows: Iterable[Any]) -> bytes:
+    """One JSON document per line."""
+    if orjson is not None:
+        return b"".join(orjson.dumps(row, default=_default, option=orjson.OPT_APPEND_NEWLINE) for row in rows)
+    return b"".join(dumps(row) + b"\n" for row in rows)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse encoded with `dumps`. Only for content the handler built from trusted rows:
+    returning a Response skips the route's response_model entirely."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class _Compressor:
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+        else:
+            # wbits 16 + 15: gzip container
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def chunk(self, data: bytes) -> bytes:
+        """Compress `data` and flush, so a streamed chunk reaches the client right away."""
+        if self.encoding == "br":
+            return self._brotli.process(data) + self._brotli.flush()
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self.encoding == "br":
+            return self._brotli.process(data) + self._brotli.finish()
+        return self._zlib.compress(data) + self._zlib.flush()
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """"br" if accepted and available, else "gzip" if accepted, else None (q=0 means refused)."""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    for encoding in ("br", "gzip"):
+        if encoding == "br" and brotli is None:
+            continue
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+class CompressionMiddleware:
+    """Pure ASGI gzip / brotli response compression negotiated from Accept-Encoding.
+
+    Only text-like types (COMPRESSIBLE_TYPES) are compressed, and complete bodies only from
+    `minimum_size` bytes. Other responses (server-sent events included) have their headers
+    forwarded immediately and their body untouched. Streamed bodies are compressed and
+    flushed chunk by chunk.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 5, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", "")) if scope["type"] == "http" else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        start_message = None
+        compressor: Optional[_Compressor] = None
+
+        async def send_wrapper(message):
+            nonlocal start_message, compressor
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "").split(";")[0].strip()
+                if "content-encoding" in headers or content_type not in COMPRESSIBLE_TYPES:
+                    # sent at once: an event stream must not wait for its first event
+                    await send(message)
+                    return
+                # held back until the first body chunk decides whether to compress
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start_message is not None:
+                start, start_message = start_message, None
+                if not more_body and len(body) < self.minimum_size:
+                    await send(start)
+                    await send(message)
+                    return
+                compressor = _Compressor(encoding, self.gzip_level, self.brotli_quality)
+                headers = MutableHeaders(raw=start["headers"])
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if more_body:
+                    del headers["Content-Length"]
+                    body = compressor.chunk(body)
+                else:
+                    body = compressor.finish(body)
+                    headers["Content-Length"] = str(len(body))
+                await send(start)
+                await send({"type": "http.response.body", "body": body, "more_body": more_body})
+                return
+            if compressor is not None:
+                body = compressor.chunk(body) if more_body else compressor.finish(body)
+                message = {"type": "http.response.body", "body": body, "more_body": more_body}
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
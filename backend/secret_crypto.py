@@ -0,0 +1,235 @@
+import base64
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+# Envelope encryption of Secret.value: every secret is sealed with its own AES-256-GCM data key,
+# and that data key is stored wrapped (encrypted) by a master key held by a key provider
+# ("local" key file, or "openbao" transit engine, see openbao.py). Unwrapped data keys are kept
+# in a small LRU cache with a TTL and overwritten with zeros when they leave it.
+#
+# Stored format: enc:v1:<provider>:<wrapped key b64>:<nonce b64>:<ciphertext b64>
+# Values without the prefix are legacy plaintext rows (see encrypt_secrets.py).
+
+PREFIX = "enc:v1:"
+NONCE_BYTES = 12
+KEY_BYTES = 32
+# next to this module, not the working directory: starting the app from elsewhere must find the same key
+DEFAULT_MASTER_KEY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "master.key")
+
+
+class MasterKeyMissing(RuntimeError):
+    pass
+
+
+class SecretUnavailable(Exception):
+    """A stored value that cannot be opened with the configured key provider."""
+
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode("ascii")
+
+
+def zeroize(key: bytearray):
+    """Overwrite key material in place (best effort: copies made by libraries are out of reach)."""
+    for i in range(len(key)):
+        key[i] = 0
+
+
+class LocalKeyProvider:
+    """Master key read from a file. For development and tests; production deployments should
+    keep the master key in a KMS.
+
+    The file is never created implicitly: a fresh key would leave every secret sealed with the
+    old one undecryptable. `create` is the explicit init step (bootstrap.py runs it); until
+    then using the provider raises MasterKeyMissing.
+    """
+
+    name = "local"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._master: Optional[AESGCM] = None
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def create(self) -> bool:
+        """Write a new random master key (0600) unless the file exists; returns whether it did."""
+        try:
+            fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "wb") as f:
+            f.write(os.urandom(KEY_BYTES))
+        return True
+
+    def _key(self) -> AESGCM:
+        with self._lock:
+            if self._master is None:
+                try:
+                    with open(self.path, "rb") as f:
+                        self._master = AESGCM(f.read())
+                except FileNotFoundError:
+                    raise MasterKeyMissing(f"Master key file {self.path} not found") from None
+            return self._master
+
+    def generate_data_key(self) -> tuple[bytearray, bytes]:
+        """Return a fresh data key and its wrapped form."""
+        key = bytearray(os.urandom(KEY_BYTES))
+        nonce = os.urandom(NONCE_BYTES)
+        return key, nonce + self._key().encrypt(nonce, bytes(key), b"data-key")
+
+    def unwrap(self, wrapped: bytes) -> bytearray:
+        return bytearray(self._key().decrypt(wrapped[:NONCE_BYTES], wrapped[NONCE_BYTES:], b"data-key"))
+
+
+class DataKeyCache:
+    """Unwrapped data keys by wrapped key, at most `max_entries` (LRU) for `ttl` seconds.
+
+    Keys are zeroized on eviction, expiry and `clear`. `max_entries=0` disables caching.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[bytes, tuple[bytearray, float]] = OrderedDict()
+        # metrics
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, wrapped: bytes) -> Optional[bytes]:
+        """A copy of the cached key, so a concurrent eviction cannot zero it mid-use."""
+        with self._lock:
+            entry = self._entries.get(wrapped)
+            if entry is None:
+                self.misses += 1
+                return None
+            key, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[wrapped]
+                zeroize(key)
+                self.evictions += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(wrapped)
+            self.hits += 1
+            return bytes(key)
+
+    def put(self, wrapped: bytes, key: bytearray) -> bool:
+        """Hand `key` over to the cache; False if caching is disabled and the caller must zeroize it."""
+        if self.max_entries <= 0:
+            return False
+        with self._lock:
+            old = self._entries.pop(wrapped, None)
+            if old is not None:
+                zeroize(old[0])
+            self._entries[wrapped] = (key, time.monotonic() + self.ttl)
+            while len(self._entries) > self.max_entries:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                zeroize(evicted)
+                self.evictions += 1
+        return True
+
+    def clear(self):
+        with self._lock:
+            for key, _ in self._entries.values():
+                zeroize(key)
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else None,
+                "evictions": self.evictions,
+            }
+
+
+class SecretBox:
+    """Seals and opens secret values with per-value data keys from `provider`.
+
+    `aad` binds a ciphertext to its row (e.g. owner and name), so a value copied onto
+    another row fails to decrypt.
+    """
+
+    def __init__(self, provider, cache: DataKeyCache):
+        self.provider = provider
+        self.cache = cache
+
+    def new_data_key(self) -> tuple[bytearray, bytes]:
+        """A fresh (key, wrapped key) pair for `encrypt`. Providers such as OpenBao make a network
+        call here, so callers inside a transaction function get the key beforehand."""
+        return self.provider.generate_data_key()
+
+    def encrypt(self, plaintext: str, aad: str = "", data_key: Optional[tuple[bytearray, bytes]] = None) -> str:
+        """Seal `plaintext` with `data_key` (from `new_data_key`; zeroized here) or a fresh one."""
+        key, wrapped = data_key if data_key is not None else self.provider.generate_data_key()
+        nonce = os.urandom(NONCE_BYTES)
+        try:
+            ciphertext = AESGCM(bytes(key)).encrypt(nonce, plaintext.encode("utf-8"), aad.encode("utf-8"))
+        finally:
+            zeroize(key)
+        return f"{sealed_prefix(self.provider)}{_b64(wrapped)}:{_b64(nonce)}:{_b64(ciphertext)}"
+
+    def decrypt(self, stored: str, aad: str = "") -> str:
+        """Open a stored value; raises SecretUnavailable when the configured master key (or
+        provider) is not the one it was sealed with, or the row was tampered with."""
+        if not is_encrypted(stored):
+            return stored
+        provider, wrapped_b64, nonce_b64, ciphertext_b64 = stored[len(PREFIX):].split(":")
+        if provider != self.provider.name:
+            raise SecretUnavailable(f"Secret was sealed by key provider {provider!r}, configured provider is {self.provider.name!r}")
+        wrapped = base64.b64decode(wrapped_b64)
+        key = self.cache.get(wrapped)
+        try:
+            if key is None:
+                unwrapped = self.provider.unwrap(wrapped)
+                key = bytes(unwrapped)
+                if not self.cache.put(wrapped, unwrapped):
+                    zeroize(unwrapped)
+            plaintext = AESGCM(key).decrypt(base64.b64decode(nonce_b64), base64.b64decode(ciphertext_b64), aad.encode("utf-8"))
+        except InvalidTag:
+            raise SecretUnavailable("Secret does not decrypt with the configured master key (wrong key file, or the row was altered)") from None
+        except MasterKeyMissing as exc:
+            raise SecretUnavailable(str(exc)) from None
+        return plaintext.decode("utf-8")
+
+
+def is_encrypted(stored: str) -> bool:
+    return stored.startswith(PREFIX)
+
+
+def sealed_prefix(provider) -> str:
+    """Stored-value prefix of secrets sealed by `provider` (for LIKE / startswith queries)."""
+    return f"{PREFIX}{provider.name}:"
+
+
+def create_key_provider(kind: str):
+    if kind == "local":
+        return LocalKeyProvider(os.getenv("SECRET_MASTER_KEY_FILE", DEFAULT_MASTER_KEY_FILE))
+    if kind == "openbao":
+        from openbao import OpenBaoKeyProvider
+
+        return OpenBaoKeyProvider(
+            addr=os.getenv("OPENBAO_ADDR", "http://127.0.0.1:8200"),
+            token=os.environ["OPENBAO_TOKEN"],
+            key_name=os.getenv("OPENBAO_TRANSIT_KEY", "secrets"),
+            mount=os.getenv("OPENBAO_TRANSIT_MOUNT", "transit"),
+        )
+    raise ValueError(f"Unknown key provider: {kind}")
@@ -0,0 +1,137 @@
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import delete
+from sqlmodel import SQLModel, Field, Session
+
+# Auth session tokens (token -> user_id) with expiry and LRU eviction.
+# "memory" is per process; "database" shares tokens between workers through a table,
+# fronted by a short-lived local cache so lookups do not hit the DB on every request.
+
+
+class AuthSession(SQLModel, table=True):
+    token_hash: str = Field(primary_key=True)
+    user_id: int = Field(index=True)
+    expires_at: datetime = Field(index=True)
+
+
+def hash_token(token: str) -> str:
+    # only a digest is stored, so a leaked table does not leak usable tokens
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class MemorySessionStore:
+    """In-process token store: O(1) lookups, absolute expiry after `ttl` seconds,
+    least recently used tokens evicted beyond `max_entries`."""
+
+    def __init__(self, ttl: float = 12 * 3600, max_entries: int = 100_000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[int, float]] = OrderedDict()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def put(self, token: str, user_id: int, expires_at: float):
+        with self._lock:
+            self._entries[token] = (user_id, expires_at)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def create(self, user_id: int) -> str:
+        token = str(uuid.uuid4())
+        self.put(token, user_id, time.time() + self.ttl)
+        return token
+
+    def get(self, token: str) -> Optional[int]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            user_id, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return user_id
+
+    def cached(self, token: str) -> Optional[int]:
+        """Lookup that never does I/O; for this store the same as `get`."""
+        return self.get(token)
+
+    def revoke(self, token: str):
+        with self._lock:
+            self._entries.pop(token, None)
+
+
+class DatabaseSessionStore:
+    """Token store shared by all workers via the `authsession` table.
+
+    Validated tokens are cached locally for at most `cache_ttl` seconds, so a revocation
+    made by another worker takes effect within that window.
+    """
+
+    # purge expired rows once every this many logins
+    PURGE_EVERY = 1000
+
+    def __init__(self, engine, ttl: float = 12 * 3600, cache_ttl: float = 30, max_cached: int = 100_000):
+        self.engine = engine
+        self.ttl = ttl
+        self.cache_ttl = cache_ttl
+        self._cache = MemorySessionStore(ttl=cache_ttl, max_entries=max_cached)
+        self._created = 0
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def create(self, user_id: int) -> str:
+        token = str(uuid.uuid4())
+        expires_at = datetime.utcnow() + timedelta(seconds=self.ttl)
+        with Session(self.engine) as session:
+            session.add(AuthSession(token_hash=hash_token(token), user_id=user_id, expires_at=expires_at))
+            self._created += 1
+            if self._created % self.PURGE_EVERY == 0:
+                session.exec(delete(AuthSession).where(AuthSession.expires_at <= datetime.utcnow()))
+            session.commit()
+        self._cache.put(token, user_id, time.time() + min(self.cache_ttl, self.ttl))
+        return token
+
+    def get(self, token: str) -> Optional[int]:
+        user_id = self._cache.get(token)
+        if user_id is not None:
+            return user_id
+        with Session(self.engine) as session:
+            row = session.get(AuthSession, hash_token(token))
+        if row is None:
+            return None
+        remaining = (row.expires_at - datetime.utcnow()).total_seconds()
+        if remaining <= 0:
+            return None
+        self._cache.put(token, row.user_id, time.time() + min(self.cache_ttl, remaining))
+        return row.user_id
+
+    def cached(self, token: str) -> Optional[int]:
+        """Local-cache-only lookup; None means "ask `get`", not "invalid"."""
+        return self._cache.get(token)
+
+    def revoke(self, token: str):
+        self._cache.revoke(token)
+        with Session(self.engine) as session:
+            session.exec(delete(AuthSession).where(AuthSession.token_hash == hash_token(token)))
+            session.commit()
+
+
+def create_session_store(kind: str, engine, ttl: float, max_entries: int, cache_ttl: float):
+    if kind == "memory":
+        return MemorySessionStore(ttl=ttl, max_entries=max_entries)
+    if kind == "database":
+        return DatabaseSessionStore(engine, ttl=ttl, cache_ttl=cache_ttl, max_cached=max_entries)
+    raise ValueError(f"Unknown session store: {kind}")
@@ -0,0 +1,99 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+# Per-process cache of authenticated users, keyed by user id.
+# Entries expire after `ttl` seconds. Changes made in this process invalidate entries
+# directly; changes from other workers or from create_user.py touch a shared stamp file,
+# and every process drops its whole cache when it notices the stamp's mtime moved.
+
+# next to this module, so workers and scripts started from any directory share it
+USER_CACHE_STAMP = os.getenv("USER_CACHE_STAMP", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".user_cache_stamp"))
+
+
+def touch_stamp(path: str = USER_CACHE_STAMP):
+    """Tell every process sharing `path` that cached users are stale."""
+    Path(path).touch()
+    # bump mtime explicitly: touch() within the filesystem's timestamp granularity may not change it
+    now = time.time_ns()
+    os.utime(path, ns=(now, now))
+
+
+class UserCache:
+    def __init__(self, ttl: float = 60, max_entries: int = 10_000, stamp_path: str = USER_CACHE_STAMP, stamp_interval: float = 1.0):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stamp_path = stamp_path
+        self.stamp_interval = stamp_interval
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[int, tuple[dict, float]] = OrderedDict()
+        self._stamp = self._read_stamp()
+        self._stamp_checked = time.monotonic()
+
+    def _read_stamp(self) -> Optional[int]:
+        try:
+            return os.stat(self.stamp_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _check_stamp(self):
+        # stat at most once per stamp_interval so hits stay syscall-free
+        now = time.monotonic()
+        if now - self._stamp_checked < self.stamp_interval:
+            return
+        self._stamp_checked = now
+        stamp = self._read_stamp()
+        if stamp != self._stamp:
+            self._stamp = stamp
+            self._entries.clear()
+            self.invalidations += 1
+
+    def get(self, user_id: int) -> Optional[dict]:
+        with self._lock:
+            self._check_stamp()
+            entry = self._entries.get(user_id)
+            if entry is None or entry[1] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[user_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, user_id: int, data: dict):
+        with self._lock:
+            self._entries[user_id] = (data, time.monotonic() + self.ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int, broadcast: bool = True):
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self.invalidations += 1
+        if broadcast:
+            # the touch flushes this process's cache too on its next check: adopting the new
+            # mtime here could also swallow a touch another process made just before ours
+            touch_stamp(self.stamp_path)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else None,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,210 @@
+import math
+import threading
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import SQLModel, Field, Session, select
+
+# Workflow counters for /api/stats: requests per status (overall and per requester), requests
+# created / approved / denied per day, and a histogram of time-to-resolution. Every status change
+# records its deltas in the transaction making it, so answering the endpoint reads a fixed number
+# of counters no matter how many requests exist.
+# "memory" keeps the counters per process (rebuilt from the requests table on startup);
+# "database" keeps them in a table, incremented inside the writer's transaction.
+
+STATUSES = ("pending", "in_review", "awaiting_admin", "approved", "denied")
+RESOLVED_STATUSES = ("approved", "denied")
+
+# time-to-resolution histogram: bucket i holds durations up to 2^(i / 4) seconds, so percentiles
+# (reported as bucket upper bounds) overestimate by at most 19%; the last bucket also takes
+# everything beyond 2^26 seconds (~2 years)
+TTR_BUCKETS_PER_DOUBLING = 4
+TTR_BUCKETS = 104
+
+
+class WorkflowCounter(SQLModel, table=True):
+    key: str = Field(primary_key=True)
+    value: int = 0
+
+
+def _scope(user_id: Optional[int]) -> str:
+    return "" if user_id is None else f"user:{user_id}:"
+
+
+def ttr_bucket(seconds: float) -> int:
+    if seconds <= 1:
+        return 0
+    return min(TTR_BUCKETS - 1, math.ceil(TTR_BUCKETS_PER_DOUBLING * math.log2(seconds)))
+
+
+def ttr_bucket_bound(bucket: int) -> float:
+    return 2 ** (bucket / TTR_BUCKETS_PER_DOUBLING)
+
+
+def created_deltas(requester_id: int, created_at: datetime) -> Counter:
+    deltas = Counter()
+    for scope in (_scope(None), _scope(requester_id)):
+        deltas[f"{scope}status:pending"] += 1
+        deltas[f"{scope}day:{created_at.date().isoformat()}:created"] += 1
+    return deltas
+
+
+def transition_deltas(
+    requester_id: int, from_status: str, to_status: str, created_at: datetime, resolved_at: Optional[datetime] = None,
+) -> Counter:
+    deltas = Counter()
+    for scope in (_scope(None), _scope(requester_id)):
+        deltas[f"{scope}status:{from_status}"] -= 1
+        deltas[f"{scope}status:{to_status}"] += 1
+        if resolved_at is not None:
+            deltas[f"{scope}day:{resolved_at.date().isoformat()}:{to_status}"] += 1
+            deltas[f"{scope}ttr:{ttr_bucket((resolved_at - created_at).total_seconds())}"] += 1
+    return deltas
+
+
+class MemoryWorkflowStats:
+    """Per-process counters. Deltas recorded through a Session apply only once it commits.
+
+    Only correct with a single worker: other processes' changes are not seen until restart.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Counter = Counter()
+        event.listen(Session, "after_commit", self._after_commit)
+        event.listen(Session, "after_rollback", self._after_rollback)
+
+    def record(self, session: Session, deltas: Counter):
+        """Apply `deltas` when `session` commits."""
+        session.info.setdefault("workflow_stats", Counter()).update(deltas)
+
+    def _after_commit(self, session):
+        deltas = session.info.pop("workflow_stats", None)
+        if deltas:
+            with self._lock:
+                self._counters.update(deltas)
+
+    def _after_rollback(self, session):
+        session.info.pop("workflow_stats", None)
+
+    def get(self, keys: list[str]) -> dict[str, int]:
+        with self._lock:
+            return {key: self._counters.get(key, 0) for key in keys}
+
+    def load(self, engine, model):
+        """Rebuild the counters from the `model` (SecretRequest) table."""
+        counters = rebuild_counters(engine, model)
+        with self._lock:
+            self._counters = counters
+
+
+class DatabaseWorkflowStats(MemoryWorkflowStats):
+    """Counters shared by all workers via the `workflowcounter` table.
+
+    `record` adds the deltas inside the caller's transaction, so the counters move exactly
+    when the requests do. `load` only fills an empty table (a fresh deployment, or one upgraded
+    from before the counters existed); afterwards the table is authoritative.
+    """
+
+    def __init__(self, engine):
+        super().__init__()
+        self.engine = engine
+
+    def record(self, session: Session, deltas: Counter):
+        deltas = {key: value for key, value in deltas.items() if value}
+        if not deltas:
+            return
+        if session.bind.dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        # sorted, so concurrent transactions lock the rows in the same order
+        stmt = insert(WorkflowCounter).values([{"key": key, "value": deltas[key]} for key in sorted(deltas)])
+        session.exec(stmt.on_conflict_do_update(
+            index_elements=[WorkflowCounter.key], set_={"value": WorkflowCounter.value + stmt.excluded.value},
+        ))
+
+    def get(self, keys: list[str]) -> dict[str, int]:
+        with Session(self.engine) as session:
+            rows = session.exec(select(WorkflowCounter.key, WorkflowCounter.value).where(WorkflowCounter.key.in_(keys))).all()
+        values = dict(rows)
+        return {key: values.get(key, 0) for key in keys}
+
+    def load(self, engine, model):
+        with Session(engine) as session:
+            if session.exec(select(WorkflowCounter.key).limit(1)).first() is not None:
+                return
+            counters = rebuild_counters(engine, model)
+            session.add_all(WorkflowCounter(key=key, value=value) for key, value in counters.items() if value)
+            try:
+                session.commit()
+            except IntegrityError:
+                # another worker filled the table first
+                session.rollback()
+
+
+def rebuild_counters(engine, model) -> Counter:
+    """Recount everything from the requests table (one pass, streamed)."""
+    counters = Counter()
+    statement = select(model.requester_id, model.status, model.created_at, model.resolved_at)
+    with Session(engine) as session:
+        for requester_id, status, created_at, resolved_at in session.exec(statement.execution_options(yield_per=1000)):
+            counters.update(created_deltas(requester_id, created_at))
+            if status != "pending":
+                counters.update(transition_deltas(
+                    requester_id, "pending", status, created_at, resolved_at if status in RESOLVED_STATUSES else None,
+                ))
+    return counters
+
+
+def create_workflow_stats(kind: str, engine):
+    if kind == "memory":
+        return MemoryWorkflowStats()
+    if kind == "database":
+        return DatabaseWorkflowStats(engine)
+    raise ValueError(f"Unknown workflow stats store: {kind}")
+
+
+def _percentile(histogram: list[int], total: int, q: float) -> Optional[float]:
+    """Upper bound of the bucket holding the q-quantile."""
+    if not total:
+        return None
+    rank = q * total
+    seen = 0
+    for bucket, count in enumerate(histogram):
+        seen += count
+        if seen >= rank:
+            return round(ttr_bucket_bound(bucket), 1)
+    return round(ttr_bucket_bound(len(histogram) - 1), 1)
+
+
+def summarize(stats, user_id: Optional[int], days: int, today: Optional[date] = None) -> dict:
+    """Counts per status, per-day throughput for the last `days` days and time-to-resolution
+    percentiles, overall (`user_id` None) or for one requester. Reads a fixed set of counters."""
+    scope = _scope(user_id)
+    today = today or datetime.utcnow().date()
+    dates = [(today - timedelta(days=offset)).isoformat() for offset in range(days - 1, -1, -1)]
+    status_keys = [f"{scope}status:{status}" for status in STATUSES]
+    day_keys = [f"{scope}day:{day}:{kind}" for day in dates for kind in ("created", *RESOLVED_STATUSES)]
+    ttr_keys = [f"{scope}ttr:{bucket}" for bucket in range(TTR_BUCKETS)]
+    values = stats.get(status_keys + day_keys + ttr_keys)
+
+    counts = {status: values[key] for status, key in zip(STATUSES, status_keys)}
+    counts["total"] = sum(counts.values())
+    daily = [
+        {"date": day, **{kind: values[f"{scope}day:{day}:{kind}"] for kind in ("created", *RESOLVED_STATUSES)}}
+        for day in dates
+    ]
+    histogram = [values[key] for key in ttr_keys]
+    resolved = sum(histogram)
+    return {
+        "counts": counts,
+        "daily": daily,
+        "time_to_resolution": {
+            "resolved": resolved,
+            **{f"p{int(q * 100)}_seconds": _percentile(histogram, resolved, q) for q in (0.5, 0.9, 0.99)},
+        },
+    }
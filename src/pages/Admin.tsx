@@ -11,8 +11,16 @@ type Req = {
   created_at: string;
 };
 
+type Stats = {
+  counts: Record<string, number>;
+  time_to_resolution: { resolved: number; p50_seconds: number | null; p90_seconds: number | null };
+};
+
 const Admin = () => {
   const [requests, setRequests] = useState<Req[]>([]);
+  const [stats, setStats] = useState<Stats | null>(null);
+  // X-Next-Cursor of the last page loaded; null once every request is shown
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const token = localStorage.getItem("access_token");
 
   useEffect(() => {
@@ -25,6 +33,18 @@ const Admin = () => {
     if (!res.ok) return;
     const data = await res.json();
     setRequests(data);
+    setNextCursor(res.headers.get('X-Next-Cursor'));
+    const statsRes = await fetch('/api/stats?days=7', { headers: { Authorization: `Bearer ${token}` } });
+    if (statsRes.ok) setStats(await statsRes.json());
+  }
+
+  async function loadMore() {
+    if (!token || !nextCursor) return;
+    const res = await fetch(`/api/requests?all=true&cursor=${encodeURIComponent(nextCursor)}`, { headers: { Authorization: `Bearer ${token}` } });
+    if (!res.ok) return;
+    const data = await res.json();
+    setRequests((prev) => [...prev, ...data]);
+    setNextCursor(res.headers.get('X-Next-Cursor'));
   }
 
   async function approve(id: number) {
@@ -45,6 +65,16 @@ const Admin = () => {
       <Sidebar />
       <main className="flex-1 p-8">
         <h1 className="text-3xl font-bold mb-8">Панель администратора</h1>
+        {stats && (
+          <div className="flex gap-6 mb-6 text-sm text-muted-foreground">
+            {Object.entries(stats.counts).map(([status, count]) => (
+              <span key={status}>{status}: <b>{count}</b></span>
+            ))}
+            {stats.time_to_resolution.p50_seconds !== null && (
+              <span>p50: <b>{Math.round(stats.time_to_resolution.p50_seconds / 60)} мин</b></span>
+            )}
+          </div>
+        )}
         <div className="bg-card border border-border rounded-lg overflow-hidden">
           <table className="w-full">
             <thead className="bg-muted/50">
@@ -80,6 +110,11 @@ const Admin = () => {
             </tbody>
           </table>
         </div>
+        {nextCursor && (
+          <div className="mt-4 text-center">
+            <button className="btn" onClick={loadMore}>Загрузить ещё</button>
+          </div>
+        )}
       </main>
     </div>
   );
@@ -17,6 +17,8 @@ type Req = {
 
 const Requests = () => {
   const [requests, setRequests] = useState<Req[]>([]);
+  // X-Next-Cursor of the last page loaded; null once every request is shown
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [isAdmin, setIsAdmin] = useState(false);
   const [newName, setNewName] = useState("");
   const [newReason, setNewReason] = useState("");
@@ -52,17 +54,21 @@ const Requests = () => {
     };
   }, []);
 
-  async function loadRequests(adminFlag?: boolean) {
+  // first page, or with `cursor` the page after it (appended: "load more")
+  async function loadRequests(adminFlag?: boolean, cursor?: string) {
     if (!token) return;
     const useAdmin = typeof adminFlag === 'boolean' ? adminFlag : isAdmin;
-    const url = useAdmin ? '/api/requests?all=true' : '/api/requests';
-    const res = await fetch(url, { headers: { Authorization: `Bearer ${token}` } });
+    const params = new URLSearchParams();
+    if (useAdmin) params.set('all', 'true');
+    if (cursor) params.set('cursor', cursor);
+    const res = await fetch(`/api/requests?${params}`, { headers: { Authorization: `Bearer ${token}` } });
     if (!res.ok) {
       console.error('Failed to load requests', res.status);
       return;
     }
     const data = await res.json();
-    setRequests(data);
+    setRequests((prev) => (cursor ? [...prev, ...data] : data));
+    setNextCursor(res.headers.get('X-Next-Cursor'));
   }
 
   function createRequest() {
@@ -175,6 +181,11 @@ const Requests = () => {
             </tbody>
           </table>
         </div>
+        {nextCursor ? (
+          <div className="mt-4 text-center">
+            <button className="btn" onClick={() => loadRequests(undefined, nextCursor)}>Загрузить ещё</button>
+          </div>
+        ) : null}
       </main>
     </div>
   );
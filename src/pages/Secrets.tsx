@@ -27,17 +27,27 @@ const Secrets = () => {
     host: "",
   });
   const [secrets, setSecrets] = useState<Secret[]>(mockSecrets);
+  // X-Next-Cursor of the last page loaded; null once every secret is shown
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
 
-  useEffect(() => {
+  // first page, or with `cursor` the page after it (appended: "load more")
+  const loadSecrets = (cursor?: string) => {
     const token = localStorage.getItem('access_token');
     if (!token) return;
-    fetch('/api/secrets', { headers: { Authorization: `Bearer ${token}` } })
-      .then(r => r.json())
-      .then(data => {
+    const url = cursor ? `/api/secrets?cursor=${encodeURIComponent(cursor)}` : '/api/secrets';
+    fetch(url, { headers: { Authorization: `Bearer ${token}` } })
+      .then(async r => {
+        if (!r.ok) return;
         // expect array of secret objects
-        setSecrets(data as Secret[]);
+        const data = (await r.json()) as Secret[];
+        setSecrets(prev => (cursor ? [...prev, ...data] : data));
+        setNextCursor(r.headers.get('X-Next-Cursor'));
       })
       .catch(() => {});
+  };
+
+  useEffect(() => {
+    loadSecrets();
   }, []);
 
   const handleCreateSecret = () => {
@@ -145,12 +155,11 @@ const Secrets = () => {
                 <p className="text-xs text-muted-foreground">Последний доступ: {secret.lastAccess}</p>
               </div>
               <Button variant="default" onClick={() => {
-                // show secret value in alert for now (value provided by backend for authorized users)
+                // show secret value in alert for now (fetched one at a time; every view is audited)
                 const token = localStorage.getItem('access_token');
-                fetch(`/api/secrets`, { headers: { Authorization: `Bearer ${token}` } })
-                  .then(r => r.json())
-                  .then(list => {
-                    const s = (list as any[]).find(x => String(x.id) === String(secret.id));
+                fetch(`/api/secrets/${secret.id}`, { headers: { Authorization: `Bearer ${token}` } })
+                  .then(r => r.ok ? r.json() : null)
+                  .then(s => {
                     if (s && s.value) alert('Секрет: ' + s.value);
                     else alert('Секрет недоступен или не найден');
                   }).catch(() => alert('Ошибка получения секрета'))
@@ -158,6 +167,11 @@ const Secrets = () => {
             </div>
           ))}
         </div>
+        {nextCursor && (
+          <div className="mt-4 text-center">
+            <Button variant="outline" onClick={() => loadSecrets(nextCursor)}>Загрузить ещё</Button>
+          </div>
+        )}
       </main>
     </div>
   );